@@ -1,9 +1,11 @@
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QVBoxLayout, QHBoxLayout, QProgressBar,
-    QGraphicsOpacityEffect, QSizePolicy,
+    QGraphicsOpacityEffect, QSizePolicy, QApplication,
 )
 from PyQt5.QtGui import QPixmap, QFont, QFontMetrics, QPainter, QColor
 from PyQt5.QtCore import Qt, QObject,QTimer, QPropertyAnimation
+import heapq
+import itertools
 import os
 
 class AlertOverlay(QWidget):
@@ -129,7 +131,29 @@ class AlertOverlay(QWidget):
         painter.drawRoundedRect(self.rect(), 12, 12)
         super().paintEvent(event)
 
+class Alert:
+    def __init__(self, text: str, image: QPixmap | str | None, current: int | None, maximum: int | None,
+                 duration: int, priority: int):
+        self.text = text
+        self.image = image
+        self.current = current
+        self.maximum = maximum
+        self.duration = duration
+        self.priority = priority
+
+
 class AlertsManager(QObject):
+    """
+    One overlay at the top of the window, reused for every alert.
+    create_alert only records what to show, the overlay is updated at most once a display frame, so a loop can report
+    progress on every iteration. Alerts created with override replace the one on screen, the rest wait in a queue
+    (highest priority first) for it to expire, unless they outrank it.
+    """
+    LOW = 0
+    NORMAL = 1
+    HIGH = 2
+    MAX_QUEUED = 20
+
     _instance = None
     @classmethod
     def instance(cls) -> "AlertsManager":
@@ -137,13 +161,29 @@ class AlertsManager(QObject):
     def __init__(self, parent: QWidget):
         super().__init__(parent)
         self.parent = parent
-        self.overlay = None
+        self.overlay = AlertOverlay(self.parent)
+        self.overlay.setWindowFlags(Qt.WindowType.Widget | Qt.WindowType.FramelessWindowHint)
+        self.overlay.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.overlay.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
+        self.overlay.hide()
         self.timer = QTimer(self)
         self.timer.setSingleShot(True)
-        self.timer.timeout.connect(self._start_fade_out)
+        self.timer.timeout.connect(self._expire)
         self.image_cache = {}
         self.fade_duration = 0
-        self.fade_anim = None
+        self.fade_anim = QPropertyAnimation(self.overlay.opacity_effect, b"opacity", self)
+        self.fade_anim.finished.connect(self._fade_finished)
+
+        self.current: Alert | None = None
+        self.pending: Alert | None = None  # Newest replacement for what's on screen, shown on the next frame
+        self.queue: list[tuple[int, int, Alert]] = []  # (-priority, order, alert) heap
+        self._order = itertools.count()
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 60.0
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setSingleShot(True)
+        self.frame_timer.setInterval(max(1, int(1000 / (refresh_rate or 60.0))))
+        self.frame_timer.timeout.connect(self._render)
         self.parent.installEventFilter(self)
 
     @classmethod
@@ -155,59 +195,73 @@ class AlertsManager(QObject):
     @classmethod
     def create_alert(cls, text: str = "", image: QPixmap | str | None = None,
                      current_progress: int | None = None, max_progress: int | None = None,
-                     override: bool = False, duration: int = 3000):
-        self = cls.init(parent=cls._instance.parent if cls._instance else None)
-
-        if self.overlay is None or not override:
-            self.overlay = AlertOverlay(self.parent)
-            self.overlay.setParent(self.parent)
-            self.overlay.setWindowFlags(Qt.WindowType.Widget | Qt.WindowType.FramelessWindowHint)
-            self.overlay.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
-            self.overlay.setAttribute(Qt.WidgetAttribute.WA_ShowWithoutActivating)
-
-        if isinstance(image, str):
-            pixmap = self._load_image(image)
-        elif isinstance(image, QPixmap):
-            pixmap = image
+                     override: bool = False, duration: int = 3000, priority: int = NORMAL):
+        self = cls._instance
+        if self is None:
+            return
+        alert = Alert(text, image, current_progress, max_progress, duration, priority)
+        showing = self.current if self.pending is None else self.pending
+
+        if override or showing is None or priority > showing.priority:
+            if not override and self.pending is not None:
+                heapq.heappush(self.queue, (-self.pending.priority, next(self._order), self.pending))
+            self.pending = alert
+            if not self.frame_timer.isActive():
+                self.frame_timer.start()
+            return
+
+        heapq.heappush(self.queue, (-priority, next(self._order), alert))
+        if len(self.queue) > self.MAX_QUEUED:
+            # Drops the lowest priority, newest entry.
+            self.queue.remove(max(self.queue))
+            heapq.heapify(self.queue)
+
+    def _render(self):
+        alert = self.pending
+        if alert is None:
+            return
+        if self.current is not None and self.current.priority > alert.priority and self.timer.isActive():
+            return  # Waits for the higher priority alert on screen to expire
+        self.pending = None
+        self._show(alert)
+
+    def _show(self, alert: Alert):
+        if isinstance(alert.image, str):
+            pixmap = self._load_image(alert.image)
+        elif isinstance(alert.image, QPixmap):
+            pixmap = alert.image
         else:
             pixmap = None
-
-        self.overlay.set_content(text=text, image=pixmap,
-                                 current=current_progress, maximum=max_progress)
-
-        def _show_overlay():
-            self.overlay.adjustSize()
-            parent_geo = self.parent.contentsRect()
-            x = parent_geo.x() + int((parent_geo.width() - self.overlay.width()) / 2)
-            y = parent_geo.y() + 20
-            self.overlay.move(x, y)
+        self.overlay.set_content(text=alert.text, image=pixmap, current=alert.current, maximum=alert.maximum)
+        self.current = alert
+        self.reposition_overlay()
+        if not self.overlay.isVisible() or self.fade_anim.endValue() == 0.0:
             self.overlay.raise_()
             self.overlay.show()
-            self.overlay.set_opacity(0.0)
-            self._start_fade_in()
+            self._fade(0.0, 1.0)
             self.reposition_overlay()
+        self.timer.start(alert.duration)
+
+    def _expire(self):
+        if self.pending is not None:
+            self.current = None
+            self._render()
+        elif self.queue:
+            self._show(heapq.heappop(self.queue)[2])
+        else:
+            self.current = None
+            self._fade(1.0, 0.0)
 
-        QTimer.singleShot(0, _show_overlay)
-        self.timer.start(duration)
-
-    def _start_fade_in(self):
-        if self.fade_anim:
-            self.fade_anim.stop()
-        self.fade_anim = QPropertyAnimation(self.overlay.opacity_effect, b"opacity")
+    def _fade(self, start: float, end: float):
+        self.fade_anim.stop()
         self.fade_anim.setDuration(self.fade_duration)
-        self.fade_anim.setStartValue(0.0)
-        self.fade_anim.setEndValue(1.0)
+        self.fade_anim.setStartValue(start)
+        self.fade_anim.setEndValue(end)
         self.fade_anim.start()
 
-    def _start_fade_out(self):
-        if self.fade_anim:
-            self.fade_anim.stop()
-        self.fade_anim = QPropertyAnimation(self.overlay.opacity_effect, b"opacity")
-        self.fade_anim.setDuration(self.fade_duration)
-        self.fade_anim.setStartValue(1.0)
-        self.fade_anim.setEndValue(0.0)
-        self.fade_anim.finished.connect(self.hide_overlay)
-        self.fade_anim.start()
+    def _fade_finished(self):
+        if self.fade_anim.endValue() == 0.0 and self.current is None:
+            self.hide_overlay()
 
     def hide_overlay(self):
         if self.overlay:
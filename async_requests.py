@@ -1,118 +1,443 @@
 import asyncio
-from PyQt5.QtCore import QObject, QUrl, QByteArray, pyqtSignal
+import json
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Optional, Union
+from PyQt5.QtCore import QObject, QUrl, QByteArray
 from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
-from PyQt5.QtGui import QPixmap
 
+from http_cache import ResponseCache, CachedResponse
 
-class _AsyncRequestHandler(QObject):
-    finished = pyqtSignal(QNetworkReply)
+# Renamed in Qt 5.15, older PyQt5 builds only have the upper case spelling.
+_HTTP2_ALLOWED = getattr(QNetworkRequest.Attribute, "Http2AllowedAttribute", None) or QNetworkRequest.HTTP2AllowedAttribute
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.manager = QNetworkAccessManager()
-        self.manager.finished.connect(self.finished.emit)
 
-    async def send(self, request: QNetworkRequest, method: str = "GET", data: bytes = None) -> QNetworkReply:
-        loop = asyncio.get_event_loop()
-        future = loop.create_future()
+class RequestError(Exception):
+    """Base of everything AsyncRequests raises for a failed request. transient errors are worth retrying."""
+    transient = False
+
+    def __init__(self, url: str, message: str):
+        super().__init__(f"{message} ({url})")
+        self.url = url
+
+
+class RequestTimeout(RequestError):
+    transient = True
+
+    def __init__(self, url: str, timeout: float):
+        super().__init__(url, f"Request timed out after {timeout:g}s")
+        self.timeout = timeout
+
+
+class NetworkError(RequestError):
+    def __init__(self, url: str, code: int, message: str):
+        super().__init__(url, f"Network error: {message}")
+        self.code = code
+        # Qt groups its error codes: < 200 are connection / proxy failures, 401-499 are server side errors.
+        self.transient = code < 200 or 401 <= code < 500
+
+
+class HTTPStatusError(RequestError):
+    def __init__(self, url: str, status: int, reason: str = ""):
+        super().__init__(url, f"HTTP {status} {reason}".strip())
+        self.status = status
+        self.transient = status >= 500 or status == 429
+
+
+class CircuitOpenError(RequestError):
+    def __init__(self, url: str, host: str, retry_in: float):
+        super().__init__(url, f"{host} is failing, not retrying for another {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class _CircuitBreaker:
+    """
+    Per host. After FAILURE_THRESHOLD transient failures in a row the host is considered down and requests fail fast
+    for RESET_TIMEOUT seconds, after which a single trial request decides whether it is back.
+    """
+    FAILURE_THRESHOLD = 5
+    RESET_TIMEOUT = 30.0
+
+    def __init__(self, host: str):
+        self.host = host
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    def before_request(self, url: str) -> bool:
+        """Raises CircuitOpenError while the host is down, returns True if this request is the trial."""
+        if self.opened_at is None:
+            return False
+        waited = time.monotonic() - self.opened_at
+        if waited < self.RESET_TIMEOUT:
+            raise CircuitOpenError(url, self.host, self.RESET_TIMEOUT - waited)
+        if self.trial_running:
+            raise CircuitOpenError(url, self.host, 0)
+        self.trial_running = True
+        return True
+
+    def trial_abandoned(self):
+        """The trial was cancelled before it could tell anything, the next request gets to be the trial."""
+        self.trial_running = False
 
-        def handle_finished(reply: QNetworkReply):
-            self.finished.disconnect(handle_finished)
-            future.set_result(reply)
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
 
-        self.finished.connect(handle_finished)
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.FAILURE_THRESHOLD:
+            self.opened_at = time.monotonic()
+            print(f"[warn] {self.host} marked as down after {self.failures} failures")
 
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.RESET_TIMEOUT
+
+
+class _PendingRequest:
+    __slots__ = ("request", "method", "data", "on_start", "cancelled")
+
+    def __init__(self, request: QNetworkRequest, method: str, data: bytes, on_start: Callable[[QNetworkReply], None]):
+        self.request = request
+        self.method = method
+        self.data = data
+        self.on_start = on_start
+        self.cancelled = False
+
+
+class _AsyncRequestHandler(QObject):
+    """
+    The one QNetworkAccessManager of the app, so every request shares its connection pool, DNS cache and TLS sessions.
+    Requests are started at most MAX_PER_HOST at a time per host, the rest wait in a per host queue.
+    """
+    MAX_PER_HOST = 6
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.manager = QNetworkAccessManager(self)
+        # Qt doesn't follow redirects by default, release downloads and CDNs answer with 302s.
+        self.manager.setRedirectPolicy(QNetworkRequest.RedirectPolicy.NoLessSafeRedirectPolicy)
+        self.in_flight: dict[QNetworkReply, asyncio.Future] = {}
+        self._active: dict[str, int] = defaultdict(int)
+        self._queues: dict[str, deque[_PendingRequest]] = defaultdict(deque)
+
+    def _start(self, request: QNetworkRequest, method: str, data: bytes = None) -> QNetworkReply:
         method = method.upper()
         if method == "GET":
-            reply = self.manager.get(request)
+            return self.manager.get(request)
         elif method == "POST":
-            reply = self.manager.post(request, QByteArray(data or b""))
+            return self.manager.post(request, QByteArray(data or b""))
         elif method == "PUT":
-            reply = self.manager.put(request, QByteArray(data or b""))
+            return self.manager.put(request, QByteArray(data or b""))
         elif method == "DELETE":
-            reply = self.manager.deleteResource(request)
+            return self.manager.deleteResource(request)
         elif method == "HEAD":
-            reply = self.manager.head(request)
+            return self.manager.head(request)
         elif method == "PATCH":
-            reply = self.manager.sendCustomRequest(request, b"PATCH", QByteArray(data or b""))
+            return self.manager.sendCustomRequest(request, b"PATCH", QByteArray(data or b""))
+        raise ValueError(f"Unsupported HTTP method: {method}")
+
+    def submit(self, request: QNetworkRequest, method: str, data: bytes,
+               on_start: Callable[[QNetworkReply], None]) -> _PendingRequest:
+        """Starts the request now if its host has room, otherwise queues it. on_start gets the reply once it exists."""
+        request.setAttribute(_HTTP2_ALLOWED, True)
+        request.setAttribute(QNetworkRequest.Attribute.HttpPipeliningAllowedAttribute, True)
+        pending = _PendingRequest(request, method, data, on_start)
+        host = request.url().host()
+        if self._active[host] < self.MAX_PER_HOST:
+            self._launch(host, pending)
         else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
+            self._queues[host].append(pending)
+        return pending
+
+    def _launch(self, host: str, pending: _PendingRequest):
+        self._active[host] += 1
+        try:
+            reply = self._start(pending.request, pending.method, pending.data)
+        except Exception:
+            self._release(host)
+            raise
+        reply.finished.connect(lambda: self._release(host))
+        pending.on_start(reply)
+
+    def _release(self, host: str):
+        self._active[host] -= 1
+        queue = self._queues.get(host)
+        while queue:
+            pending = queue.popleft()
+            if not pending.cancelled:
+                self._launch(host, pending)
+                break
+
+    def queued_count(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def send(self, request: QNetworkRequest, method: str = "GET", data: bytes = None,
+                   sink: Optional[bytearray] = None) -> QNetworkReply:
+        """
+        Every reply resolves its own future through its own finished signal, so concurrent requests can't get
+        each other's replies. Cancelling the awaiting task drops it from the queue or aborts the reply.
+
+        sink: If given the body is drained into it chunk by chunk as readyRead fires, so nothing big is left to
+        copy out of the reply in one go once it finishes.
+        """
+        future = asyncio.get_event_loop().create_future()
+        started: list[QNetworkReply] = []
+
+        def on_start(reply: QNetworkReply):
+            started.append(reply)
+            self.in_flight[reply] = future
+
+            def drain():
+                if reply.bytesAvailable():
+                    sink.extend(reply.readAll().data())
 
-        return await future
+            def handle_finished():
+                self.in_flight.pop(reply, None)
+                if future.done():
+                    reply.deleteLater()
+                    return
+                if sink is not None:
+                    drain()
+                future.set_result(reply)
+
+            if sink is not None:
+                reply.readyRead.connect(drain)
+            reply.finished.connect(handle_finished)
+
+        pending = self.submit(request, method, data, on_start)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            pending.cancelled = True
+            if started:
+                reply = started[0]
+                self.in_flight.pop(reply, None)
+                if reply.isRunning():
+                    reply.abort()
+                else:
+                    reply.deleteLater()
+            raise
 
 
 class AsyncRequests:
     _handler: _AsyncRequestHandler = None
+    _revalidating: set[str] = set()
+    _breakers: dict[str, _CircuitBreaker] = {}
+
+    DEFAULT_TIMEOUT = 15.0
+    DEFAULT_RETRIES = 2
+    BASE_BACKOFF = 0.5
+    MAX_BACKOFF = 8.0
+    IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
 
     @classmethod
     def init(cls, app):
         if cls._handler is None:
             cls._handler = _AsyncRequestHandler(app)
+            ResponseCache.init()
 
     @classmethod
-    async def request(cls, method: str, url: str, data: bytes = None, headers: dict = None, raw: bool = False):
+    def handler(cls) -> _AsyncRequestHandler:
         if cls._handler is None:
-            raise RuntimeError("")
+            raise RuntimeError("AsyncRequests.init() has to be called before making requests")
+        return cls._handler
+
+    @classmethod
+    def in_flight_count(cls) -> int:
+        return len(cls._handler.in_flight) if cls._handler else 0
 
-        request = QNetworkRequest(QUrl(url))
-        if headers:
-            for k, v in headers.items():
-                request.setRawHeader(k.encode(), v.encode())
+    @classmethod
+    def breaker_for(cls, host: str) -> _CircuitBreaker:
+        if host not in cls._breakers:
+            cls._breakers[host] = _CircuitBreaker(host)
+        return cls._breakers[host]
 
-        reply = await cls._handler.send(request, method=method, data=data)
-        return cls._read_reply(reply, raw=raw)
+    @classmethod
+    def _backoff(cls, attempt: int) -> float:
+        # Full jitter, so a burst of failed requests doesn't come back as a burst.
+        return random.uniform(0, min(cls.MAX_BACKOFF, cls.BASE_BACKOFF * (2 ** attempt)))
 
     @classmethod
-    async def get(cls, url: str, headers: dict = None, raw: bool = False):
-        return await cls.request("GET", url, headers=headers, raw=raw)
+    def _reply_error(cls, url: str, reply: QNetworkReply) -> Optional[RequestError]:
+        if reply.error() == QNetworkReply.NetworkError.NoError:
+            return None
+        status = cls._reply_status(reply)
+        if status >= 400:
+            reason = reply.attribute(QNetworkRequest.Attribute.HttpReasonPhraseAttribute) or ""
+            return HTTPStatusError(url, status, str(reason))
+        return NetworkError(url, int(reply.error()), reply.errorString())
 
     @classmethod
-    async def post(cls, url: str, data: bytes, headers: dict = None, raw: bool = False):
-        return await cls.request("POST", url, data=data, headers=headers, raw=raw)
+    async def _send(cls, method: str, url: str, data: bytes = None, headers: dict = None,
+                    timeout: Optional[float] = None, retries: Optional[int] = None) -> tuple[QNetworkReply, bytearray]:
+        """
+        Sends with a deadline per attempt, retries transient failures of idempotent methods with jittered
+        exponential backoff and goes through the host's circuit breaker.
+        Returns the successful reply with its streamed body, or raises a RequestError. The caller deletes the reply.
+        """
+        handler = cls.handler()
+        method = method.upper()
+        host = QUrl(url).host()
+        breaker = cls.breaker_for(host)
+        timeout = cls.DEFAULT_TIMEOUT if timeout is None else timeout
+        if retries is None:
+            retries = cls.DEFAULT_RETRIES if method in cls.IDEMPOTENT_METHODS else 0
 
-    @staticmethod
-    def _read_reply(reply: QNetworkReply, raw: bool = False):
-        if reply.error() != QNetworkReply.NetworkError.NoError:
-            msg = reply.errorString()
-            reply.deleteLater()
-            raise Exception(f"Network error: {msg}")
-        data = reply.readAll().data()
+        attempt = 0
+        while True:
+            is_trial = breaker.before_request(url)
+
+            request = QNetworkRequest(QUrl(url))
+            if headers:
+                for k, v in headers.items():
+                    request.setRawHeader(k.encode(), v.encode())
+
+            body = bytearray()
+            try:
+                reply = await asyncio.wait_for(handler.send(request, method=method, data=data, sink=body), timeout)
+            except asyncio.TimeoutError:
+                error = RequestTimeout(url, timeout)
+            except asyncio.CancelledError:
+                # Otherwise trial_running stays set and the host fails fast until a restart.
+                if is_trial:
+                    breaker.trial_abandoned()
+                raise
+            else:
+                error = cls._reply_error(url, reply)
+                if error is None:
+                    breaker.record_success()
+                    return reply, body
+                reply.deleteLater()
+
+            if error.transient:
+                breaker.record_failure()
+            else:
+                # The host answered, it just didn't like the request.
+                breaker.record_success()
+            if not error.transient or attempt >= retries:
+                raise error
+            await asyncio.sleep(cls._backoff(attempt))
+            attempt += 1
+
+    @classmethod
+    async def request(cls, method: str, url: str, data: bytes = None, headers: dict = None, raw: bool = False,
+                      cache: bool = False, cache_ttl: float = 0, timeout: Optional[float] = None,
+                      retries: Optional[int] = None, as_memoryview: bool = False):
+        """
+        cache: GETs go through the ResponseCache, fresh entries never touch the network, stale ones are
+        revalidated with ETag / Last-Modified, and if the network is gone any cached copy is better than nothing.
+        cache_ttl: How long a response counts as fresh when the server doesn't say.
+        timeout: Seconds each attempt gets, DEFAULT_TIMEOUT if not given.
+        retries: Extra attempts for transient failures, defaults to DEFAULT_RETRIES for idempotent methods and 0 otherwise.
+        raw: Return the body undecoded, as bytes or with as_memoryview a memoryview over the received buffer (no copy).
+
+        Failures raise a RequestError subclass (RequestTimeout, NetworkError, HTTPStatusError, CircuitOpenError).
+        """
+        body = await cls._fetch_body(method, url, data, headers, cache, cache_ttl, timeout, retries)
+        if not raw:
+            return body.decode("utf-8", errors="replace")
+        if as_memoryview:
+            return memoryview(body)
+        return body if isinstance(body, bytes) else bytes(body)
+
+    @classmethod
+    async def get_json(cls, url: str, headers: dict = None, cache: bool = False, cache_ttl: float = 0,
+                       timeout: Optional[float] = None, retries: Optional[int] = None) -> Any:
+        """
+        GET and parse straight from the received bytes, without decoding them to a str first. The parse runs on the
+        calling thread: json.loads holds the GIL throughout, so a worker thread wouldn't keep the GUI any more responsive.
+        Raises ValueError for bodies that aren't JSON.
+        """
+        body = await cls._fetch_body("GET", url, None, headers, cache, cache_ttl, timeout, retries)
+        return json.loads(body)
+
+    @classmethod
+    async def _fetch_body(cls, method: str, url: str, data: Optional[bytes], headers: Optional[dict], cache: bool,
+                          cache_ttl: float, timeout: Optional[float], retries: Optional[int]) -> Union[bytes, bytearray]:
+        if cache and method.upper() == "GET":
+            return await cls._cached_get(url, headers, cache_ttl, timeout, retries)
+        reply, body = await cls._send(method, url, data=data, headers=headers, timeout=timeout, retries=retries)
         reply.deleteLater()
-        return data if raw else data.decode("utf-8", errors="replace")
+        return body
 
+    @classmethod
+    async def get(cls, url: str, headers: dict = None, raw: bool = False, cache: bool = False, cache_ttl: float = 0,
+                  timeout: Optional[float] = None, retries: Optional[int] = None, as_memoryview: bool = False):
+        return await cls.request("GET", url, headers=headers, raw=raw, cache=cache, cache_ttl=cache_ttl,
+                                 timeout=timeout, retries=retries, as_memoryview=as_memoryview)
 
-class AsyncPixmapLoader(QObject):
-    finished = pyqtSignal(QPixmap)
-    error = pyqtSignal(str)
+    @classmethod
+    async def post(cls, url: str, data: bytes, headers: dict = None, raw: bool = False,
+                   timeout: Optional[float] = None, retries: Optional[int] = None):
+        return await cls.request("POST", url, data=data, headers=headers, raw=raw, timeout=timeout, retries=retries)
 
-    def __init__(self, url, parent=None):
-        super().__init__(parent)
-        self.url = url
-        self.manager = QNetworkAccessManager(self)
-        self.manager.finished.connect(self.on_finished)
-
-    def start(self):
-        request = QNetworkRequest(QUrl(self.url))
-        from updater import Updater
-        request.setRawHeader(b"User-Agent",b"Mozilla/5.0 (compatible; Universal Resonance Stone/" + Updater.VERSION.encode('utf-8') + b")")
-        self.reply = self.manager.get(request)
-        self.reply.finished.connect(self.handle_reply_finished)
-
-    def handle_reply_finished(self):
-        if self.reply.error():
-            self.error.emit(f"Network error: {self.reply.errorString()}")
-            self.reply.deleteLater()
-            return
+    @classmethod
+    async def _cached_get(cls, url: str, headers: dict, cache_ttl: float,
+                          timeout: Optional[float] = None, retries: Optional[int] = None) -> bytes:
+        entry = ResponseCache.get(url)
+        now = time.time()
+        if entry is not None:
+            if entry.is_fresh(now):
+                return entry.body
+            if entry.is_within_stale_window(now):
+                cls._revalidate_in_background(url, headers, cache_ttl)
+                return entry.body
+
+        try:
+            return (await cls._fetch_into_cache(url, headers, cache_ttl, entry, timeout, retries)).body
+        except RequestError as e:
+            if isinstance(e, HTTPStatusError) and not e.transient:
+                ResponseCache.evict(url)  # The server answered, the resource is gone or off limits now
+                raise
+            if entry is None:
+                raise
+            print(f"[warn] Serving cached copy of {url}: {e}")
+            return entry.body
 
-        data = self.reply.readAll()
-        pixmap = QPixmap()
-        if not pixmap.loadFromData(data):
-            self.error.emit("Failed to load image data")
-            self.reply.deleteLater()
+    @classmethod
+    async def _fetch_into_cache(cls, url: str, headers: dict, cache_ttl: float, entry: Optional[CachedResponse],
+                                timeout: Optional[float] = None, retries: Optional[int] = None) -> CachedResponse:
+        request_headers = dict(headers or {})
+        if entry is not None:
+            request_headers.update(entry.revalidation_headers())
+
+        reply, body = await cls._send("GET", url, headers=request_headers, timeout=timeout, retries=retries)
+        status = cls._reply_status(reply)
+        response_headers = cls._reply_headers(reply)
+        reply.deleteLater()
+        if status == 304 and entry is not None:
+            return ResponseCache.revalidated(entry, response_headers)
+        return ResponseCache.store(url, status, response_headers, bytes(body), cache_ttl)
+
+    @classmethod
+    def _revalidate_in_background(cls, url: str, headers: dict, cache_ttl: float):
+        if url in cls._revalidating:
             return
 
-        self.finished.emit(pixmap)
-        self.reply.deleteLater()
+        async def _revalidate():
+            try:
+                await cls._fetch_into_cache(url, headers, cache_ttl, ResponseCache.get(url))
+            except Exception as e:
+                print(f"[warn] Background revalidation of {url} failed: {e}")
+            finally:
+                cls._revalidating.discard(url)
 
-    def on_finished(self, reply):
-        pass
\ No newline at end of file
+        cls._revalidating.add(url)
+        asyncio.ensure_future(_revalidate())
+
+    @staticmethod
+    def _reply_status(reply: QNetworkReply) -> int:
+        status = reply.attribute(QNetworkRequest.Attribute.HttpStatusCodeAttribute)
+        return int(status) if status is not None else 0
+
+    @staticmethod
+    def _reply_headers(reply: QNetworkReply) -> dict[str, str]:
+        return {bytes(name).decode("latin-1").lower(): bytes(value).decode("latin-1")
+                for name, value in reply.rawHeaderPairs()}
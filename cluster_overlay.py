@@ -0,0 +1,151 @@
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter, QColor, QFontMetrics
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem, QWidget
+import numpy as np
+
+from grouping import BasicGrouping
+
+
+class ClusterOverlay(QGraphicsItem):
+    """
+    One item that paints every cluster badge of the zoomed out map, instead of one item per badge.
+    Badges keep the same on screen size at any zoom and only the ones inside the exposed rect are painted.
+    """
+    BADGE_SIZE = 34  # Screen pixels
+
+    def __init__(self, min_zoom: float):
+        super().__init__()
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+        self.setZValue(9998)
+        self.min_zoom = min_zoom
+        self.centers = np.empty((0, 2), dtype=np.float64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._bounds = QRectF()
+
+    def set_badges(self, centers: np.ndarray, counts: np.ndarray):
+        self.prepareGeometryChange()
+        self.centers = centers
+        self.counts = counts
+        if len(centers):
+            # Badges are never bigger than they are at the minimum zoom, so pad by that.
+            pad = self.BADGE_SIZE / self.min_zoom
+            low, high = centers.min(axis=0), centers.max(axis=0)
+            self._bounds = QRectF(low[0] - pad, low[1] - pad, high[0] - low[0] + 2 * pad, high[1] - low[1] + 2 * pad)
+        else:
+            self._bounds = QRectF()
+        self.update()
+
+    def clear(self):
+        self.set_badges(np.empty((0, 2), dtype=np.float64), np.empty(0, dtype=np.int64))
+
+    def boundingRect(self) -> QRectF:
+        return self._bounds
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget = None):
+        if not len(self.centers):
+            return
+        lod = option.levelOfDetailFromTransform(painter.worldTransform()) or 1.0
+        size = self.BADGE_SIZE / lod
+        half = size / 2
+
+        exposed = option.exposedRect
+        visible = np.nonzero(
+            (self.centers[:, 0] + half >= exposed.left()) & (self.centers[:, 0] - half <= exposed.right()) &
+            (self.centers[:, 1] + half >= exposed.top()) & (self.centers[:, 1] - half <= exposed.bottom())
+        )[0]
+        if not len(visible):
+            return
+
+        pen = BasicGrouping.badge_pen()
+        pen.setCosmetic(True)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(pen)
+        painter.setBrush(BasicGrouping.badge_brush())
+        for i in visible.tolist():
+            x, y = self.centers[i]
+            painter.drawEllipse(QRectF(x - half, y - half, size, size))
+
+        # Text is drawn unscaled so it stays crisp, the font is the same one the group boxes use.
+        font = BasicGrouping.badge_font()
+        metrics = QFontMetrics(font)
+        painter.save()
+        painter.scale(1 / lod, 1 / lod)
+        painter.setFont(font)
+        painter.setPen(QColor(BasicGrouping.BADGE_TEXT_COLOR))
+        for i in visible.tolist():
+            x, y = self.centers[i] * lod
+            text = str(int(self.counts[i]))
+            painter.drawText(QRectF(x - self.BADGE_SIZE, y - metrics.height() / 2, self.BADGE_SIZE * 2, metrics.height()),
+                             Qt.AlignmentFlag.AlignCenter, text)
+        painter.restore()
+
+
+class GroupOverlay(QGraphicsItem):
+    """
+    Paints every box from BasicGrouping.find_obj_group(mark=True) with its count above it.
+    Boxes live in arrays (anchor bounds + one shared marker footprint) and only the visible ones get painted.
+    """
+    PADDING = 2
+    TEXT_HEIGHT = 20
+
+    def __init__(self):
+        super().__init__()
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+        self.setZValue(9999)
+        self.anchor_bounds = np.empty((0, 4), dtype=np.float64)  # min_x, min_y, max_x, max_y of the group's anchors
+        self.counts = np.empty(0, dtype=np.int64)
+        self.marker_extent = np.zeros(4, dtype=np.float64)  # left, top, right, bottom of a marker around its anchor
+        self.rects = np.empty((0, 4), dtype=np.float64)
+        self._bounds = QRectF()
+
+    def set_groups(self, anchor_bounds: np.ndarray, counts: np.ndarray):
+        self.anchor_bounds = anchor_bounds
+        self.counts = counts
+        self._rebuild()
+
+    def set_marker_extent(self, left: float, top: float, right: float, bottom: float):
+        self.marker_extent = np.array([left, top, right, bottom], dtype=np.float64)
+        self._rebuild()
+
+    def clear(self):
+        self.set_groups(np.empty((0, 4), dtype=np.float64), np.empty(0, dtype=np.int64))
+
+    def _rebuild(self):
+        self.prepareGeometryChange()
+        padding = np.array([-self.PADDING, -self.PADDING, self.PADDING, self.PADDING], dtype=np.float64)
+        self.rects = self.anchor_bounds + self.marker_extent + padding
+        if len(self.rects):
+            left, top = self.rects[:, 0].min(), self.rects[:, 1].min() - self.TEXT_HEIGHT
+            right, bottom = self.rects[:, 2].max(), self.rects[:, 3].max()
+            self._bounds = QRectF(left, top, right - left, bottom - top).adjusted(-2, -2, 2, 2)
+        else:
+            self._bounds = QRectF()
+        self.update()
+
+    def boundingRect(self) -> QRectF:
+        return self._bounds
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: QWidget = None):
+        if not len(self.rects):
+            return
+        exposed = option.exposedRect
+        rects = self.rects
+        visible = np.nonzero(
+            (rects[:, 2] >= exposed.left()) & (rects[:, 0] <= exposed.right()) &
+            (rects[:, 3] >= exposed.top()) & (rects[:, 1] - self.TEXT_HEIGHT <= exposed.bottom())
+        )[0]
+        if not len(visible):
+            return
+
+        painter.setPen(BasicGrouping.badge_pen())
+        painter.setBrush(BasicGrouping.badge_brush())
+        for i in visible.tolist():
+            left, top, right, bottom = rects[i]
+            painter.drawRect(QRectF(left, top, right - left, bottom - top))
+
+        painter.setFont(BasicGrouping.badge_font())
+        painter.setPen(QColor(BasicGrouping.BADGE_TEXT_COLOR))
+        for i in visible.tolist():
+            left, top = rects[i][0], rects[i][1]
+            painter.drawText(QRectF(left + 4, top - self.TEXT_HEIGHT, 200, self.TEXT_HEIGHT),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignBottom, str(int(self.counts[i])))
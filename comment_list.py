@@ -0,0 +1,308 @@
+import asyncio
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QPoint, QEvent, QTimer
+from PyQt5.QtGui import QPainter, QColor, QFont, QFontMetrics, QMouseEvent, QGuiApplication, QPalette
+from PyQt5.QtWidgets import (
+    QListView, QStyledItemDelegate, QStyleOptionViewItem, QAbstractItemView, QMenu, QWidget
+)
+from typing import Dict, List, Optional, Tuple
+
+from async_requests import RequestError
+from comment_thumbnails import ThumbnailCache
+from comment_card import CommentCard
+from loaded_data import LoadedData
+
+
+class CommentListModel(QAbstractListModel):
+    CardRole = Qt.ItemDataRole.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cards: List[CommentCard] = []
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.cards)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        card = self.cards[index.row()]
+        if role == self.CardRole:
+            return card
+        if role == Qt.ItemDataRole.DisplayRole:
+            return card.comment
+        return None
+
+    def append_cards(self, cards: List[CommentCard]):
+        if not cards:
+            return
+        start = len(self.cards)
+        self.beginInsertRows(QModelIndex(), start, start + len(cards) - 1)
+        self.cards.extend(cards)
+        for card in cards:
+            card.on_changed = self.card_changed
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        for card in self.cards:
+            card.on_changed = None
+        self.cards = []
+        self.endResetModel()
+
+    def card_changed(self, card: CommentCard):
+        for row, other in enumerate(self.cards):
+            if other is card:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                return
+
+
+class CommentDelegate(QStyledItemDelegate):
+    """Paints a comment the way the old CommentCard widget laid it out: image, text, then the vote row."""
+    MARGIN = 8
+    SPACING = 8
+    IMAGE_HEIGHT = 200
+    TEXT_PADDING = (4, 4, 50, 4)  # left, top, right, bottom
+    ACTIONS_HEIGHT = 28
+    ICON_SIZE = 20
+
+    def __init__(self, view: "CommentListView"):
+        super().__init__(view)
+        self.view = view
+        self.font = QFont("Arial", 10)
+        self.meta_font = QFont("Arial", 10)
+        self._text_heights: Dict[Tuple[int, int], int] = {}  # (id(card), text width) -> height
+
+    def clear_layout_cache(self):
+        self._text_heights.clear()
+
+    def row_width(self) -> int:
+        return max(100, self.view.viewport().width() - 2 * self.view.spacing())
+
+    def image_size(self) -> QSize:
+        return QSize(self.row_width() - 2 * self.MARGIN, self.IMAGE_HEIGHT)
+
+    def _text_height(self, card: CommentCard, width: int) -> int:
+        key = (id(card), width)
+        height = self._text_heights.get(key)
+        if height is None:
+            rect = QFontMetrics(self.font).boundingRect(QRect(0, 0, width, 100000), Qt.TextFlag.TextWordWrap, card.comment)
+            height = rect.height()
+            self._text_heights[key] = height
+        return height
+
+    def _layout(self, rect: QRect, card: CommentCard) -> Tuple[Optional[QRect], QRect, QRect, QRect, QRect]:
+        """Image, text, like button, dislike button and count rects of a card drawn inside rect."""
+        left, top, right, bottom = self.TEXT_PADDING
+        x = rect.x() + self.MARGIN
+        y = rect.y() + self.MARGIN
+        inner_width = rect.width() - 2 * self.MARGIN
+
+        image_rect = None
+        if card.has_image:
+            image_rect = QRect(x, y, inner_width, self.IMAGE_HEIGHT)
+            y += self.IMAGE_HEIGHT + self.SPACING
+
+        text_width = max(10, inner_width - left - right)
+        text_rect = QRect(x + left, y + top, text_width, self._text_height(card, text_width))
+        y = text_rect.bottom() + 1 + bottom + self.SPACING
+
+        like_rect = QRect(x, y, self.ACTIONS_HEIGHT, self.ACTIONS_HEIGHT)
+        count_rect = QRect(like_rect.right() + 4, y, 40, self.ACTIONS_HEIGHT)
+        count_rect.setWidth(QFontMetrics(self.meta_font).horizontalAdvance(str(card.like_count)) + 8)
+        dislike_rect = QRect(count_rect.right() + 4, y, self.ACTIONS_HEIGHT, self.ACTIONS_HEIGHT)
+        return image_rect, text_rect, like_rect, dislike_rect, count_rect
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        card: CommentCard = index.data(CommentListModel.CardRole)
+        width = self.row_width()
+        *_, like_rect, _, _ = self._layout(QRect(0, 0, width, 0), card)
+        return QSize(width, like_rect.bottom() + 1 + self.MARGIN)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        card: CommentCard = index.data(CommentListModel.CardRole)
+        image_rect, text_rect, like_rect, dislike_rect, count_rect = self._layout(option.rect, card)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        if image_rect is not None:
+            if card.pixmap is not None:
+                pixmap = card.pixmap
+                source = QRect(0, 0, min(pixmap.width(), image_rect.width()), min(pixmap.height(), image_rect.height()))
+                painter.drawPixmap(image_rect.topLeft(), pixmap, source)
+            else:
+                painter.setPen(Qt.PenStyle.NoPen)
+                painter.setBrush(QColor(0, 0, 0, 15))
+                painter.drawRoundedRect(image_rect, 8, 8)
+
+        text_color = option.palette.color(QPalette.ColorRole.Text)
+        painter.setPen(text_color)
+        painter.setFont(self.font)
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft | Qt.TextFlag.TextWordWrap, card.comment)
+
+        like_icon = 'thumbs_up_selected.png' if card.voted == "up" else 'thumbs_up_dark.png'
+        dislike_icon = 'thumbs_down_selected.png' if card.voted == "down" else 'thumbs_down_dark.png'
+        for rect, icon_name in ((like_rect, like_icon), (dislike_rect, dislike_icon)):
+            icon = LoadedData.qicon_cache.get(icon_name)
+            if icon is not None:
+                icon_rect = QRect(0, 0, self.ICON_SIZE, self.ICON_SIZE)
+                icon_rect.moveCenter(rect.center())
+                icon.paint(painter, icon_rect)
+
+        painter.setFont(self.meta_font)
+        painter.drawText(count_rect, Qt.AlignmentFlag.AlignCenter, str(card.like_count))
+
+        meta_rect = QRect(dislike_rect.right() + 8, dislike_rect.y(),
+                          option.rect.right() - self.MARGIN - dislike_rect.right() - 8, self.ACTIONS_HEIGHT)
+        meta = f"- {card.username} ({card.date})"
+        if card.vote_status == CommentCard.VOTE_PENDING:
+            meta += "  · sending vote"
+        elif card.vote_status == CommentCard.VOTE_FAILED:
+            meta += "  · vote failed"
+        painter.setPen(QColor("gray"))
+        painter.drawText(meta_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, meta)
+        painter.restore()
+
+    def vote_at(self, rect: QRect, card: CommentCard, pos: QPoint) -> Optional[str]:
+        _, _, like_rect, dislike_rect, _ = self._layout(rect, card)
+        if like_rect.contains(pos):
+            return "up"
+        if dislike_rect.contains(pos):
+            return "down"
+        return None
+
+    def editorEvent(self, event: QEvent, model: CommentListModel, option: QStyleOptionViewItem, index: QModelIndex) -> bool:
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            card: CommentCard = index.data(CommentListModel.CardRole)
+            direction = self.vote_at(option.rect, card, event.pos())
+            if direction is not None:
+                card.vote(direction)
+                model.dataChanged.emit(index, index)
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class CommentListView(QListView):
+    """
+    The Web panel's comment list. Rows are painted by CommentDelegate, so a marker with hundreds of comments
+    costs the same as one with a handful, and images are only requested for the rows that are on screen.
+    """
+    # Rows this close (in pixels) to the viewport already get their image, so it's there when they scroll in.
+    THUMBNAIL_MARGIN = 200
+
+    def __init__(self, parent: QWidget = None):
+        super().__init__(parent)
+        self.list_model = CommentListModel(self)
+        self.delegate = CommentDelegate(self)
+        self.setModel(self.list_model)
+        self.setItemDelegate(self.delegate)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setUniformItemSizes(False)
+        self.setSpacing(6)
+        self.setMouseTracking(True)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+
+        self._tasks: Dict[int, asyncio.Task] = {}  # row -> thumbnail task
+        self._thumbnail_timer = QTimer(self)
+        self._thumbnail_timer.setSingleShot(True)
+        self._thumbnail_timer.setInterval(0)
+        self._thumbnail_timer.timeout.connect(self.load_visible_thumbnails)
+        self.verticalScrollBar().valueChanged.connect(lambda _: self._thumbnail_timer.start())
+        self.verticalScrollBar().rangeChanged.connect(lambda *_: self._thumbnail_timer.start())
+        self.list_model.rowsInserted.connect(lambda *_: self._thumbnail_timer.start())
+
+    def add_cards(self, cards: List[CommentCard]):
+        self.list_model.append_cards(cards)
+
+    def clear_cards(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self.delegate.clear_layout_cache()
+        self.list_model.clear()
+        self.verticalScrollBar().setValue(0)
+
+    def resizeEvent(self, event):
+        self.delegate.clear_layout_cache()
+        super().resizeEvent(event)
+        self._thumbnail_timer.start()
+
+    def _visible_rows(self) -> range:
+        viewport = self.viewport().rect().adjusted(0, -self.THUMBNAIL_MARGIN, 0, self.THUMBNAIL_MARGIN)
+        count = self.list_model.rowCount()
+        if not count:
+            return range(0)
+        first = self.indexAt(QPoint(self.spacing() + 1, max(0, viewport.top()) + self.spacing())).row()
+        if first < 0:
+            first = 0
+            while first < count and self.visualRect(self.list_model.index(first)).bottom() < viewport.top():
+                first += 1
+        last = first
+        while last < count and self.visualRect(self.list_model.index(last)).top() <= viewport.bottom():
+            last += 1
+        return range(first, last)
+
+    def load_visible_thumbnails(self):
+        visible = self._visible_rows()
+        # Rows that left the view give their network slot back, they'll be asked for again when they return.
+        for row in [row for row in self._tasks if row not in visible]:
+            self._tasks.pop(row).cancel()
+
+        size = self.delegate.image_size()
+        for row in visible:
+            card = self.list_model.cards[row]
+            if card.image_state != CommentCard.IMAGE_PENDING or row in self._tasks:
+                continue
+            pixmap = ThumbnailCache.cached(card.image_url, size)
+            if pixmap is not None:
+                card.set_pixmap(pixmap)
+                self._row_changed(row, False)
+                continue
+            self._tasks[row] = asyncio.ensure_future(self._load_thumbnail(row, card, size))
+
+    async def _load_thumbnail(self, row: int, card: CommentCard, size: QSize):
+        try:
+            pixmap = await ThumbnailCache.thumbnail(card.image_url, size)
+        except (RequestError, ValueError) as e:
+            print(f"Image load error: {e}")
+            pixmap = None
+        finally:
+            if self._tasks.get(row) is asyncio.current_task():
+                del self._tasks[row]
+
+        # The list was cleared or refilled while this was loading.
+        if row >= len(self.list_model.cards) or self.list_model.cards[row] is not card:
+            return
+        if pixmap is None:
+            card.set_image_failed()
+            self._row_changed(row, True)
+            return
+        card.set_pixmap(pixmap)
+        self._row_changed(row, card.image_state != CommentCard.IMAGE_LOADED)
+
+    def _row_changed(self, row: int, resized: bool):
+        index = self.list_model.index(row)
+        if resized:
+            self.delegate.sizeHintChanged.emit(index)
+        self.list_model.dataChanged.emit(index, index)
+
+    def mouseMoveEvent(self, event: QMouseEvent):
+        index = self.indexAt(event.pos())
+        over_button = index.isValid() and self.delegate.vote_at(
+            self.visualRect(index), index.data(CommentListModel.CardRole), event.pos()) is not None
+        self.viewport().setCursor(Qt.CursorShape.PointingHandCursor if over_button else Qt.CursorShape.ArrowCursor)
+        super().mouseMoveEvent(event)
+
+    def show_context_menu(self, pos: QPoint):
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return
+        card: CommentCard = index.data(CommentListModel.CardRole)
+        menu = QMenu(self)
+        copy_action = menu.addAction("Copy Comment")
+        if menu.exec_(self.viewport().mapToGlobal(pos)) == copy_action:
+            QGuiApplication.clipboard().setText(card.comment)
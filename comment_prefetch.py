@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Iterable, Optional, Tuple
+
+from PyQt5.QtCore import QTimer
+
+from async_requests import AsyncRequests, RequestError
+from http_cache import ResponseCache
+from loaded_data import LoadedData
+from settings import SettingsManager
+from webhandler import UnofficialDataLoader
+
+MarkerKey = Tuple[int, int]  # official id, label id
+
+
+class CommentPrefetcher:
+    """
+    Opt in ("prefetch_comments" setting) warming of the first comment page of markers the user is likely to click,
+    the one resting under the cursor and the members of groups found by BasicGrouping. Responses land in the
+    ResponseCache, so the click that follows is served from there.
+
+    Everything runs one request at a time, only while nothing else is in flight, at most one request every
+    MIN_INTERVAL seconds and MAX_PER_MINUTE a minute. Hovered markers jump the queue and are dropped when the
+    cursor leaves before their request is done.
+    """
+    HOVER_DELAY_MS = 250
+    MIN_INTERVAL = 1.0
+    MAX_PER_MINUTE = 20
+    MAX_QUEUED = 40
+    IDLE_WAIT = 0.2  # How long to back off while foreground requests are in flight
+
+    _hover_timer: Optional[QTimer] = None
+    _hovered: Optional[MarkerKey] = None
+    _hover_queue: Deque[MarkerKey] = deque()
+    _group_queue: Deque[MarkerKey] = deque()
+    _sent: Deque[float] = deque()
+    _worker: Optional[asyncio.Task] = None
+    _current: Optional[Tuple[MarkerKey, asyncio.Task]] = None
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(SettingsManager.settings_data.get('prefetch_comments', {}).get('value', False))
+
+    @classmethod
+    def hover_enter(cls, _id: int, label_id: int):
+        if not cls.enabled():
+            return
+        if cls._hover_timer is None:
+            cls._hover_timer = QTimer()
+            cls._hover_timer.setSingleShot(True)
+            cls._hover_timer.timeout.connect(cls._hover_settled)
+        cls._hovered = (_id, label_id)
+        cls._hover_timer.start(cls.HOVER_DELAY_MS)
+
+    @classmethod
+    def hover_leave(cls, _id: int, label_id: int):
+        key = (_id, label_id)
+        if cls._hovered != key:
+            return
+        cls._hovered = None
+        if cls._hover_timer is not None:
+            cls._hover_timer.stop()
+        try:
+            cls._hover_queue.remove(key)
+        except ValueError:
+            pass
+        if cls._current is not None and cls._current[0] == key:
+            cls._current[1].cancel()
+
+    @classmethod
+    def _hover_settled(cls):
+        if cls._hovered is None:
+            return
+        if cls._hovered not in cls._hover_queue:
+            cls._hover_queue.appendleft(cls._hovered)
+        cls._start()
+
+    @classmethod
+    def prefetch_markers(cls, markers: Iterable[MarkerKey]):
+        """Queues markers behind anything hovered, for when they're likely to be clicked next."""
+        if not cls.enabled():
+            return
+        for key in markers:
+            if len(cls._group_queue) >= cls.MAX_QUEUED:
+                break
+            if key not in cls._group_queue:
+                cls._group_queue.append(key)
+        cls._start()
+
+    @classmethod
+    def _start(cls):
+        if cls._worker is None or cls._worker.done():
+            cls._worker = asyncio.ensure_future(cls._run())
+
+    @classmethod
+    def _next(cls) -> Optional[Tuple[MarkerKey, str]]:
+        while cls._hover_queue or cls._group_queue:
+            key = cls._hover_queue.popleft() if cls._hover_queue else cls._group_queue.popleft()
+            url = cls._page_url(*key)
+            if url is None:
+                continue
+            cached = ResponseCache.get(url)
+            if cached is not None and cached.is_fresh(time.time()):
+                continue
+            return key, url
+        return None
+
+    @staticmethod
+    def _page_url(_id: int, label_id: int) -> Optional[str]:
+        oid = LoadedData.id_oid_dataset.get(str(label_id))
+        uid = LoadedData.official_id_to_unofficial_id.get(str(_id))
+        if not oid or not uid:
+            return None
+        return UnofficialDataLoader.page_url(oid, uid, 1)
+
+    @classmethod
+    async def _wait_for_slot(cls):
+        while True:
+            now = time.time()
+            while cls._sent and now - cls._sent[0] > 60:
+                cls._sent.popleft()
+            wait = 0.0
+            if len(cls._sent) >= cls.MAX_PER_MINUTE:
+                wait = 60 - (now - cls._sent[0])
+            elif cls._sent:
+                wait = cls.MIN_INTERVAL - (now - cls._sent[-1])
+            if wait <= 0 and AsyncRequests.in_flight_count() == 0:
+                return
+            await asyncio.sleep(max(wait, cls.IDLE_WAIT))
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await cls._wait_for_slot()
+            if not cls.enabled():
+                cls._hover_queue.clear()
+                cls._group_queue.clear()
+                return
+            item = cls._next()
+            if item is None:
+                return
+            key, url = item
+            cls._sent.append(time.time())
+            task = asyncio.ensure_future(AsyncRequests.get_json(url, headers=UnofficialDataLoader.headers, cache=True,
+                                                                cache_ttl=UnofficialDataLoader.ttl, retries=0))
+            cls._current = (key, task)
+            # asyncio.wait doesn't raise when the hover leaves and cancels the task, the worker just moves on.
+            await asyncio.wait({task})
+            cls._current = None
+            if not task.cancelled() and isinstance(task.exception(), (RequestError, ValueError)):
+                print(f"[prefetch] Failed to prefetch comments: {task.exception()}")
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set, Tuple
+
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QImage, QPixmap
+
+from async_requests import AsyncRequests
+
+
+class ThumbnailCache:
+    """
+    Comment images, downloaded, decoded and scaled to the size the comment list paints them at on worker threads.
+
+    Downloaded images are stored as they came, content addressed, application_data/thumbnails/<sha256>.img, with
+    index.json mapping each image url to its hash so a url can be looked up without downloading it again. Any size is
+    scaled from that copy, so resizing the comment list never downloads anything. The directory is kept under
+    _max_disk_bytes by dropping the least recently used images. Ready to paint pixmaps are kept in a memory LRU in
+    front of that.
+    """
+    _max_memory_entries = 100
+    _max_disk_bytes = 100 * 1024 * 1024
+    _memory: "OrderedDict[Tuple[str, int, int], QPixmap]" = OrderedDict()
+    _directory = "application_data/thumbnails"
+    _index: Optional[Dict[str, str]] = None  # url -> sha256 of the downloaded image
+    _executor = ThreadPoolExecutor(2, thread_name_prefix="thumbnails")
+    TIMEOUT = 20.0
+
+    @classmethod
+    def init(cls, directory: str = None):
+        if directory:
+            cls._directory = directory
+        cls._index = None
+
+    @classmethod
+    def _load_index(cls) -> Dict[str, str]:
+        if cls._index is None:
+            try:
+                with open(os.path.join(cls._directory, "index.json"), "r", encoding="utf-8") as f:
+                    cls._index = json.load(f)
+            except (OSError, ValueError):
+                cls._index = {}
+        return cls._index
+
+    @classmethod
+    def _save_index(cls):
+        path = os.path.join(cls._directory, "index.json")
+        try:
+            os.makedirs(cls._directory, exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(cls._index, f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"[warn] Failed to write thumbnail index: {e}")
+
+    @classmethod
+    def _path(cls, digest: str) -> str:
+        return os.path.join(cls._directory, f"{digest}.img")
+
+    @classmethod
+    def _remember(cls, key: Tuple[str, int, int], pixmap: QPixmap):
+        cls._memory[key] = pixmap
+        cls._memory.move_to_end(key)
+        if len(cls._memory) > cls._max_memory_entries:
+            cls._memory.popitem(last=False)
+
+    @classmethod
+    def cached(cls, url: str, size: QSize) -> Optional[QPixmap]:
+        """The pixmap if it's already in memory, without going to disk or the network."""
+        key = (url, size.width(), size.height())
+        pixmap = cls._memory.get(key)
+        if pixmap is not None:
+            cls._memory.move_to_end(key)
+        return pixmap
+
+    @classmethod
+    async def thumbnail(cls, url: str, size: QSize) -> QPixmap:
+        """
+        The image at url scaled down to fit size (never scaled up). Raises RequestError when it can't be downloaded
+        and ValueError when what came back isn't an image.
+        """
+        pixmap = cls.cached(url, size)
+        if pixmap is not None:
+            return pixmap
+
+        loop = asyncio.get_event_loop()
+        digest = cls._load_index().get(url)
+        image = None
+        if digest is not None:
+            image = await loop.run_in_executor(cls._executor, cls._read_scaled, digest, size)
+        if image is None:
+            from updater import Updater
+            headers = {"User-Agent": f"Mozilla/5.0 (compatible; Universal Resonance Stone/{Updater.VERSION})"}
+            body = await AsyncRequests.request("GET", url, headers=headers, raw=True, timeout=cls.TIMEOUT)
+            digest, image = await loop.run_in_executor(cls._executor, cls._decode_and_store, body, size)
+            if cls._index.get(url) != digest:
+                cls._index[url] = digest
+            removed = await loop.run_in_executor(cls._executor, cls._prune_disk)
+            if removed:
+                cls._index = {url: d for url, d in cls._index.items() if d not in removed}
+            cls._save_index()
+
+        # QPixmap has to be made on the GUI thread, everything expensive already happened on the workers.
+        pixmap = QPixmap.fromImage(image)
+        cls._remember((url, size.width(), size.height()), pixmap)
+        return pixmap
+
+    @staticmethod
+    def _scaled(image: QImage, size: QSize) -> QImage:
+        if image.width() > size.width() or image.height() > size.height():
+            return image.scaled(size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        return image
+
+    @classmethod
+    def _read_scaled(cls, digest: str, size: QSize) -> Optional[QImage]:
+        path = cls._path(digest)
+        try:
+            with open(path, "rb") as f:
+                image = QImage.fromData(f.read())
+            os.utime(path)  # mtime is when it was last used, for _prune_disk
+        except OSError:
+            return None
+        return None if image.isNull() else cls._scaled(image, size)
+
+    @classmethod
+    def _decode_and_store(cls, body: bytes, size: QSize) -> Tuple[str, QImage]:
+        digest = hashlib.sha256(body).hexdigest()
+        image = cls._read_scaled(digest, size)
+        if image is not None:
+            return digest, image  # Same image under another url
+
+        image = QImage.fromData(body)
+        if image.isNull():
+            raise ValueError("Failed to load image data")
+        path = cls._path(digest)
+        try:
+            os.makedirs(cls._directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(body)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"[warn] Failed to write thumbnail {path}: {e}")
+        return digest, cls._scaled(image, size)
+
+    @classmethod
+    def _prune_disk(cls) -> Set[str]:
+        """Removes the least recently used images past _max_disk_bytes, returns their digests. Runs on the executor."""
+        entries = []
+        try:
+            with os.scandir(cls._directory) as it:
+                for entry in it:
+                    if entry.name != "index.json" and not entry.name.endswith(".tmp") and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+        except OSError:
+            return set()
+        total = sum(size for _, size, _, _ in entries)
+        removed = set()
+        for _, size, path, name in sorted(entries):
+            if total <= cls._max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed.add(name.split(".")[0].split("_")[0])
+        return removed
+
+    @classmethod
+    def clear(cls):
+        cls._memory.clear()
+        cls._index = {}
+        try:
+            for filename in os.listdir(cls._directory):
+                os.remove(os.path.join(cls._directory, filename))
+        except OSError:
+            pass
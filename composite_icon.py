@@ -3,15 +3,15 @@ from PyQt5.QtGui import QPixmap, QImage,QPainter, QPainterPath
 from PyQt5.QtWidgets import (
     QGraphicsPixmapItem,
     QGraphicsItemGroup,
-    QGraphicsSceneMouseEvent
+    QGraphicsSceneMouseEvent,
+    QGraphicsSceneHoverEvent
 )
 from collections import OrderedDict
-import asyncio
 
 from helpers import reverse_linear_mapping, circular_crop_pixmap
 from loaded_data import LoadedData
 from webhandler import UnofficialDataLoader
-from menu import ButtonPanel
+from comment_prefetch import CommentPrefetcher
 class CompositeIcon(QGraphicsItemGroup):
     _global_z_counter = 1
 
@@ -91,10 +91,17 @@ class CompositeIcon(QGraphicsItemGroup):
         self.zoom_level = zoom_level
         self.update_position()
 
+    def hoverEnterEvent(self, event: QGraphicsSceneHoverEvent):
+        CommentPrefetcher.hover_enter(self.item_data['id'], self.item_data['label_id'])
+        super().hoverEnterEvent(event)
+
+    def hoverLeaveEvent(self, event: QGraphicsSceneHoverEvent):
+        CommentPrefetcher.hover_leave(self.item_data['id'], self.item_data['label_id'])
+        super().hoverLeaveEvent(event)
+
     def mousePressEvent(self, event:QGraphicsSceneMouseEvent):
         self.setSelected(True)
-        ButtonPanel.clear_comment_cards()
-        asyncio.create_task(UnofficialDataLoader.load_unofficial_data(self.item_data['id'], self.item_data['label_id']))
+        UnofficialDataLoader.open_marker(self.item_data['id'], self.item_data['label_id'])
         CompositeIcon.raise_to_top(self)
         super().mousePressEvent(event)
 
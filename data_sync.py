@@ -0,0 +1,311 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from async_requests import AsyncRequests, RequestError
+from loaded_data import LoadedData
+
+
+class SetDelta:
+    """What changed in one data/official/set_*.json since the last sync."""
+
+    def __init__(self, set_id: int, document: dict, upserts: List[dict], removed_ids: Set[int],
+                 new_labels: List[dict], watermark: str):
+        self.set_id = set_id
+        self.document = document  # The whole new set file
+        self.upserts = upserts
+        self.removed_ids = removed_ids
+        self.new_labels = new_labels  # New or changed labels
+        self.watermark = watermark
+
+    def __bool__(self) -> bool:
+        return bool(self.upserts or self.removed_ids or self.new_labels)
+
+
+class DataSync:
+    """
+    Keeps the official datasets current without re-scraping them. Each set is requested through the ResponseCache,
+    so an unchanged set costs a conditional GET and is skipped before parsing. A changed set that doesn't have the
+    shape of the local file is left alone, see _check_shape. For a changed one only points that are
+    new or differ from the local copy are merged (ctime is when a point was created, edits and moves don't touch it),
+    points that disappeared are dropped, and PointStore, the grouping caches, the id mappings and the markers of
+    affected labels are refreshed in place. Each set's digest and newest ctime are recorded in
+    application_data/sync_state.json once its changes are on disk.
+    """
+    # The point list the HoYoLAB interactive map loads per label set. The scraped set_*.json files are saved responses
+    # of it (same retcode / message / data envelope) plus a "name", _check_shape makes sure that still holds.
+    SET_URL = ("https://sg-public-api-static.hoyoverse.com/common/map_user/ys_obc/v1/map/point/list"
+               "?map_id=2&app_sn=ys_obc&lang=en-us&label_id={set_id}")
+    # What the merge, PointStore and the mappings read, required even when there's no local copy to compare with.
+    POINT_KEYS = ("id", "label_id", "x_pos", "y_pos")
+    LABEL_KEYS = ("id", "name")
+    SET_DIR = "data/official"
+    FULL_DATASET_PATH = "data/official/full/full_dataset.json"
+    ID_OID_PATH = "application_data/official_unofficial_ids.json"
+    MAPPING_PATH = "application_data/map_object_mapping.json"
+    STATE_PATH = "application_data/sync_state.json"
+    MIN_INTERVAL = 6 * 60 * 60
+    TIMEOUT = 30.0
+
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="data_sync")
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def schedule_sync(cls):
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.ensure_future(cls.sync())
+
+    @classmethod
+    def set_files(cls) -> List[Tuple[int, str]]:
+        files = []
+        for path in glob.glob(os.path.join(cls.SET_DIR, "set_*.json")):
+            match = re.fullmatch(r"set_(\d+)\.json", os.path.basename(path))
+            if match:
+                files.append((int(match.group(1)), path))
+        return sorted(files)
+
+    @classmethod
+    async def sync(cls, force: bool = False) -> int:
+        """Syncs every set, returns how many points were added, changed or removed."""
+        if LoadedData.official_dataset is None:
+            print("[DataSync] No official dataset loaded, nothing to sync into")
+            return 0
+        loop = asyncio.get_event_loop()
+        state = await loop.run_in_executor(cls._executor, cls._read_json, cls.STATE_PATH) or {}
+        if not force and time.time() - state.get("last_sync", 0) < cls.MIN_INTERVAL:
+            return 0
+        sets_state = state.setdefault("sets", {})
+
+        changed_labels: Set[int] = set()
+        new_labels: List[dict] = []
+        changed_points = 0
+        synced: Dict[str, dict] = {}  # Set state to record once full_dataset.json has the changes too
+        for set_id, path in cls.set_files():
+            set_state = sets_state.setdefault(str(set_id), {})
+            try:
+                body = await AsyncRequests.get(cls.SET_URL.format(set_id=set_id), raw=True, cache=True,
+                                               cache_ttl=cls.MIN_INTERVAL, timeout=cls.TIMEOUT)
+            except RequestError as e:
+                print(f"[DataSync] Failed to fetch set {set_id}: {e}")
+                continue
+            digest = hashlib.sha256(body).hexdigest()
+            if set_state.get("digest") == digest:
+                continue
+            try:
+                delta = await loop.run_in_executor(cls._executor, cls._diff, set_id, path, body)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[DataSync] Set {set_id} isn't a point list: {e}")
+                continue
+
+            if delta:
+                changed_labels |= cls._merge(delta)
+                new_labels.extend(delta.new_labels)
+                changed_points += len(delta.upserts) + len(delta.removed_ids)
+                await loop.run_in_executor(cls._executor, cls._write_json, path, delta.document)
+            synced[str(set_id)] = {"digest": digest, "watermark": delta.watermark}
+
+        if changed_labels or new_labels:
+            cls._refresh(changed_labels, new_labels)
+            await loop.run_in_executor(cls._executor, cls._write_json, cls.FULL_DATASET_PATH,
+                                       LoadedData.official_dataset)
+            await loop.run_in_executor(cls._executor, cls._write_json, cls.ID_OID_PATH, LoadedData.id_oid_dataset)
+            await loop.run_in_executor(cls._executor, cls._write_json, cls.MAPPING_PATH,
+                                       LoadedData.official_id_to_unofficial_id)
+        for set_id, set_state in synced.items():
+            sets_state.setdefault(set_id, {}).update(set_state)
+        state["last_sync"] = time.time()
+        await loop.run_in_executor(cls._executor, cls._write_json, cls.STATE_PATH, state)
+        print(f"[DataSync] {changed_points} points changed across {len(changed_labels)} labels")
+        return changed_points
+
+    @classmethod
+    def _diff(cls, set_id: int, path: str, body: bytes) -> SetDelta:
+        """Compares a fetched set with the local file point by point. Runs on the executor."""
+        document = json.loads(body)
+        local_document = cls._read_json(path) or {}
+        cls._check_shape(local_document, document)
+        remote = document["data"]
+        local = local_document.get("data", {})
+        local_points = {p["id"]: p for p in local.get("point_list", [])}
+
+        remote_ids = set()
+        upserts = []
+        for point in remote["point_list"]:
+            remote_ids.add(point["id"])
+            if local_points.get(point["id"]) != point:
+                upserts.append(point)
+        local_labels = {label["id"]: label for label in local.get("label_list", [])}
+        new_labels = [label for label in remote.get("label_list", []) if local_labels.get(label["id"]) != label]
+
+        document.setdefault("name", local_document.get("name", str(set_id)))
+        # ctime is "YYYY-MM-DD HH:MM:SS", so the largest string is the newest point.
+        watermark = max((p.get("ctime") or "" for p in remote["point_list"]), default="")
+        return SetDelta(set_id, document, upserts, set(local_points) - remote_ids, new_labels, watermark)
+
+    @classmethod
+    def _check_shape(cls, local_document: dict, document) -> None:
+        """
+        Raises ValueError unless document looks like the local set file, so an error response or a changed API never
+        gets written over the datasets. Every point and label has to have the keys all local ones share, with values
+        of the same kind.
+        """
+        if not isinstance(document, dict) or not isinstance(document.get("data"), dict):
+            raise ValueError("response has no data object")
+        if document.get("retcode", 0) != 0:
+            raise ValueError(f"API error {document.get('retcode')}: {document.get('message')}")
+        local = local_document.get("data") if isinstance(local_document.get("data"), dict) else {}
+        remote = document["data"]
+        missing = set(local) - set(remote)
+        if missing:
+            raise ValueError(f"data has no {', '.join(sorted(missing))}")
+        for list_name, required in (("point_list", cls.POINT_KEYS), ("label_list", cls.LABEL_KEYS)):
+            local_items = local.get(list_name) or []
+            remote_items = remote.get(list_name)
+            if not isinstance(remote_items, list):
+                raise ValueError(f"{list_name} isn't a list")
+            if local_items and not remote_items:
+                raise ValueError(f"{list_name} came back empty")
+            kinds = cls._kinds(local_items, required)
+            for item in remote_items:
+                if not isinstance(item, dict):
+                    raise ValueError(f"{list_name} has a {type(item).__name__} entry")
+                missing = kinds.keys() - item.keys()
+                if missing:
+                    raise ValueError(f"{list_name} entry {item.get('id')} has no {', '.join(sorted(missing))}")
+                for key, kind in kinds.items():
+                    if kind is not None and item[key] is not None and cls._kind(item[key]) != kind:
+                        raise ValueError(f"{list_name} entry {item.get('id')} has a {type(item[key]).__name__} {key}")
+
+    @classmethod
+    def _kinds(cls, items: List[dict], required: Tuple[str, ...]) -> Dict[str, Optional[str]]:
+        """The keys every item has, with the kind of value they hold (None where it varies or is always null)."""
+        keys = set(required)
+        if items:
+            keys |= set.intersection(*(set(item) for item in items))
+        kinds: Dict[str, Optional[str]] = {}
+        for key in keys:
+            seen = {cls._kind(item[key]) for item in items if item.get(key) is not None}
+            kinds[key] = seen.pop() if len(seen) == 1 else None
+        return kinds
+
+    @staticmethod
+    def _kind(value) -> str:
+        if isinstance(value, bool):
+            return "bool"
+        if isinstance(value, (int, float)):
+            return "number"
+        return type(value).__name__
+
+    @classmethod
+    def _merge(cls, delta: SetDelta) -> Set[int]:
+        """Applies a delta to the loaded dataset, returns the labels whose points changed."""
+        dataset = LoadedData.official_dataset
+        points: List[dict] = dataset.setdefault("point_list", [])
+        positions: Dict[int, int] = {point["id"]: i for i, point in enumerate(points)}
+        changed_labels = set()
+
+        for point in delta.upserts:
+            i = positions.get(point["id"])
+            if i is None:
+                positions[point["id"]] = len(points)
+                points.append(point)
+            else:
+                changed_labels.add(points[i]["label_id"])  # In case the point moved to another label
+                points[i] = point
+            changed_labels.add(point["label_id"])
+
+        if delta.removed_ids:
+            changed_labels |= {point["label_id"] for point in points if point["id"] in delta.removed_ids}
+            points[:] = [point for point in points if point["id"] not in delta.removed_ids]
+            for point_id in delta.removed_ids:
+                (LoadedData.official_id_to_unofficial_id or {}).pop(str(point_id), None)
+
+        labels: List[dict] = dataset.setdefault("label_list", [])
+        label_positions = {label["id"]: i for i, label in enumerate(labels)}
+        for label in delta.new_labels:
+            i = label_positions.get(label["id"])
+            if i is None:
+                labels.append(label)
+            else:
+                labels[i] = label
+        return changed_labels
+
+    @classmethod
+    def _refresh(cls, changed_labels: Set[int], new_labels: List[dict]):
+        from point_store import PointStore
+        from grouping import BasicGrouping
+        from helpers import get_all_ids, map_label_ids_by_xpos
+        from search_index import LabelSearch, SearchIndex
+        from selection_store import SelectionStore
+        from menu import ButtonPanel
+
+        points = LoadedData.official_dataset["point_list"]
+        PointStore.build(points)
+        BasicGrouping.clear_caches()
+        SelectionStore._dataset_hash = None
+
+        if new_labels:
+            cls._map_new_labels(new_labels, SearchIndex)
+            get_all_ids.cache_clear()
+            LoadedData.all_official_ids = get_all_ids()
+            LabelSearch._index = None
+
+        mapping = LoadedData.official_id_to_unofficial_id
+        unofficial_points = (LoadedData.unofficial_dataset or {}).get("data", [])
+        if mapping is not None and unofficial_points:
+            for label_id in changed_labels:
+                for point in PointStore.points_for_label(label_id):
+                    mapping.pop(str(point["id"]), None)
+                mapping.update({str(a): b for a, b in map_label_ids_by_xpos(label_id, points, unofficial_points).items()})
+
+        panel = ButtonPanel.instance
+        if panel is not None:
+            map_view = panel.window_view.map_view
+            loaded = [label_id for label_id in changed_labels if label_id in map_view.current_loaded_ids]
+            if loaded:
+                map_view.unload_ids(loaded)
+                map_view.load_ids(loaded)
+
+    @staticmethod
+    def _map_new_labels(new_labels: List[dict], index_cls):
+        """Gives labels that appeared since the mapping was generated an unofficial id, like generate_id_to_oid_mapping."""
+        id_to_oid = LoadedData.id_oid_dataset
+        if id_to_oid is None:
+            id_to_oid = LoadedData.id_oid_dataset = {}
+        name_to_oid = {name: oid for oid, name in (LoadedData.unofficial_btn_data or {}).items() if isinstance(name, str)}
+        used = set(id_to_oid.values())
+        index = index_cls()
+        for name, oid in name_to_oid.items():
+            if oid not in used:
+                index.add(name, name)
+        for label in new_labels:
+            if str(label["id"]) in id_to_oid:
+                continue
+            name = label.get("name") or ""
+            match = name if name in index else index.best_match(name, cutoff=0.5)
+            if match is None:
+                print(f"[DataSync] No unofficial id for new label {label['id']} ('{name}')")
+                continue
+            id_to_oid[str(label["id"])] = name_to_oid[match]
+            index.remove(match)
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path: str, data):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
@@ -18,15 +18,301 @@ import math
 from typing import Dict, List, Union, Optional, Any, cast
 from collections import OrderedDict, defaultdict
 
+import numpy as np
+
 from composite_icon import CompositeIcon
+from point_store import PointStore
+
+GROUPING_METRICS = ("manhattan", "euclidean", "dbscan")
+
+
+def _candidate_pairs(coords: np.ndarray, cell_size: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Every pair of points that share a grid cell or sit in neighbouring cells, each pair once.
+    Only half of the neighbourhood is walked, the other half is covered from the other side.
+    """
+    cells = np.floor(coords / cell_size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    span = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * span + cells[:, 1]
+
+    order = np.argsort(keys, kind="stable")
+    unique_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    pairs_a, pairs_b = [], []
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        target = unique_keys + (dx * span + dy)
+        found = np.searchsorted(unique_keys, target)
+        found_clipped = np.minimum(found, len(unique_keys) - 1)
+        hit = unique_keys[found_clipped] == target
+        cell_a = np.nonzero(hit)[0]
+        cell_b = found_clipped[hit]
+
+        count_a, count_b = counts[cell_a], counts[cell_b]
+        sizes = count_a * count_b
+        total = int(sizes.sum())
+        if not total:
+            continue
+        pair_of = np.repeat(np.arange(len(cell_a)), sizes)
+        local = np.arange(total) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        a = order[starts[cell_a][pair_of] + local // count_b[pair_of]]
+        b = order[starts[cell_b][pair_of] + local % count_b[pair_of]]
+        if dx == 0 and dy == 0:
+            keep = a < b
+            a, b = a[keep], b[keep]
+        pairs_a.append(a)
+        pairs_b.append(b)
+
+    if not pairs_a:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+
+def _connected_components(count: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Union-find over edge arrays, hooking roots onto the smaller root and pointer jumping until stable."""
+    labels = np.arange(count, dtype=np.int64)
+    if not len(a):
+        return labels
+    while True:
+        root_a, root_b = labels[a], labels[b]
+        if np.array_equal(root_a, root_b):
+            return labels
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(labels, root_a, low)
+        np.minimum.at(labels, root_b, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+
+def group_coordinates(coords: np.ndarray, distance: float, metric: str = "manhattan",
+                      min_samples: int = 3) -> np.ndarray:
+    """
+    Groups an (n, 2) coordinate array and returns one group index per point, -1 for points that are not in a group.
+    Group indices are ordered by group size, so group 0 is always the largest.
+
+    metric:
+        "manhattan" - single linkage, two points are linked if |dx| + |dy| <= distance.
+        "euclidean" - single linkage on the true straight line distance.
+        "dbscan"    - density based, only points with at least min_samples points (itself included)
+                      within distance can grow a group, stragglers are attached but never link groups.
+    """
+    if metric not in GROUPING_METRICS:
+        raise ValueError(f"Unsupported grouping metric: {metric}")
+
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    count = len(coords)
+    if count < 2:
+        return np.full(count, -1, dtype=np.int64)
+
+    a, b = _candidate_pairs(coords, max(float(distance), 1e-9))
+    delta = np.abs(coords[a] - coords[b])
+    if metric == "manhattan":
+        close = delta.sum(axis=1) <= distance
+    else:
+        close = np.einsum("ij,ij->i", delta, delta) <= distance * distance
+    a, b = a[close], b[close]
+
+    members = np.ones(count, dtype=bool)
+    if metric == "dbscan":
+        neighbour_counts = np.bincount(a, minlength=count) + np.bincount(b, minlength=count) + 1
+        core = neighbour_counts >= min_samples
+        core_edges = core[a] & core[b]
+        labels = _connected_components(count, a[core_edges], b[core_edges])
+
+        # A border point joins the group of the first core point that reaches it.
+        border = np.concatenate([b[core[a] & ~core[b]], a[core[b] & ~core[a]]])
+        owner = np.concatenate([a[core[a] & ~core[b]], b[core[b] & ~core[a]]])
+        border, first = np.unique(border, return_index=True)
+        labels[border] = labels[owner[first]]
+        members = core.copy()
+        members[border] = True
+    else:
+        labels = _connected_components(count, a, b)
+
+    return _rank_groups(labels, members)
+
+
+def _rank_groups(labels: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """Turns component labels into group indices ordered by size, -1 for non-members and lone points."""
+    count = len(labels)
+    sizes = np.bincount(labels[members], minlength=count)
+    grouped = members & (sizes[labels] >= 2)
+
+    group_ids = np.full(count, -1, dtype=np.int64)
+    roots = np.unique(labels[grouped])
+    if not len(roots):
+        return group_ids
+    ranking = np.empty(count, dtype=np.int64)
+    ranking[roots[np.argsort(-sizes[roots], kind="stable")]] = np.arange(len(roots))
+    group_ids[grouped] = ranking[labels[grouped]]
+    return group_ids
+
+
+class SingleLinkage:
+    """
+    Minimum spanning forest over every pair of points within max_distance.
+    Single linkage groups at any threshold up to max_distance are just the MST edges no longer than it,
+    so changing the threshold only needs a prefix of the (already sorted) edge list instead of a full regroup.
+    """
+
+    def __init__(self, coords: np.ndarray, max_distance: float, metric: str = "manhattan"):
+        if metric not in ("manhattan", "euclidean"):
+            raise ValueError(f"Single linkage does not support the {metric} metric")
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.count = len(coords)
+        self.max_distance = max_distance
+        self.metric = metric
+
+        if self.count < 2:
+            a = b = np.empty(0, dtype=np.int64)
+            weights = np.empty(0, dtype=np.float64)
+        else:
+            a, b = _candidate_pairs(coords, max(float(max_distance), 1e-9))
+            delta = np.abs(coords[a] - coords[b])
+            weights = delta.sum(axis=1) if metric == "manhattan" else np.sqrt(np.einsum("ij,ij->i", delta, delta))
+            close = weights <= max_distance
+            a, b, weights = a[close], b[close], weights[close]
+
+        order = np.argsort(weights, kind="stable")
+        a, b, weights = a[order], b[order], weights[order]
+        tree = self._boruvka(a, b)
+        tree.sort()
+        self.edges_a, self.edges_b, self.weights = a[tree], b[tree], weights[tree]
+
+    def _boruvka(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """Edge indices of the minimum spanning forest, edges must already be sorted so the index doubles as the weight rank."""
+        edge_ids = np.arange(len(a))
+        components = np.arange(self.count, dtype=np.int64)
+        tree = []
+        while len(edge_ids):
+            comp_a, comp_b = components[a[edge_ids]], components[b[edge_ids]]
+            crossing = comp_a != comp_b
+            edge_ids, comp_a, comp_b = edge_ids[crossing], comp_a[crossing], comp_b[crossing]
+            if not len(edge_ids):
+                break
+            cheapest = np.full(self.count, len(a), dtype=np.int64)
+            np.minimum.at(cheapest, comp_a, edge_ids)
+            np.minimum.at(cheapest, comp_b, edge_ids)
+            tree.append(np.unique(cheapest[cheapest < len(a)]))
+            chosen = np.concatenate(tree)
+            components = _connected_components(self.count, a[chosen], b[chosen])
+        return np.concatenate(tree) if tree else np.empty(0, dtype=np.int64)
+
+    def group_ids(self, distance: float) -> np.ndarray:
+        """Same output as group_coordinates for any distance up to max_distance."""
+        if distance > self.max_distance:
+            raise ValueError(f"Distance {distance} is past the linkage limit of {self.max_distance}")
+        cut = int(np.searchsorted(self.weights, distance, side="right"))
+        labels = _connected_components(self.count, self.edges_a[:cut], self.edges_b[:cut])
+        return _rank_groups(labels, np.ones(self.count, dtype=bool))
+
+
+def split_groups(group_ids: np.ndarray) -> List[np.ndarray]:
+    """Turns the output of group_coordinates into one index array per group, largest first."""
+    members = np.nonzero(group_ids >= 0)[0]
+    if not len(members):
+        return []
+    order = members[np.argsort(group_ids[members], kind="stable")]
+    boundaries = np.nonzero(np.diff(group_ids[order]))[0] + 1
+    return np.split(order, boundaries)
+
+
+class ClusterPyramid:
+    """
+    Zoom level pyramid of grid clusters for a single label, in the spirit of supercluster.
+    Each level is built by clustering the level below it, so clusters nest cleanly as the view zooms in.
+    """
+    # View zoom each level is made for, a level is used while the view is zoomed out to (or past) it.
+    ZOOM_LEVELS = (0.15, 0.22, 0.32, 0.45)
+    # Roughly how far apart, in screen pixels, two badges end up.
+    CLUSTER_RADIUS = 70
+
+    _cache: Dict[int, "ClusterPyramid"] = {}
+
+    def __init__(self, coords: np.ndarray):
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        centers = coords
+        counts = np.ones(len(coords), dtype=np.int64)
+        membership = np.arange(len(coords), dtype=np.int64)
+
+        # (centers, counts, membership) per level, membership maps every point to its cluster on that level.
+        self.levels: List[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for zoom in reversed(self.ZOOM_LEVELS):
+            if len(centers):
+                cell = self.CLUSTER_RADIUS / zoom
+                cells = np.floor(centers / cell).astype(np.int64)
+                cells -= cells.min(axis=0)
+                keys = cells[:, 0] * (int(cells[:, 1].max()) + 1) + cells[:, 1]
+                _, inverse = np.unique(keys, return_inverse=True)
+                inverse = inverse.reshape(-1)
+
+                new_counts = np.bincount(inverse, weights=counts).astype(np.int64)
+                new_centers = np.column_stack((
+                    np.bincount(inverse, weights=centers[:, 0] * counts),
+                    np.bincount(inverse, weights=centers[:, 1] * counts),
+                )) / new_counts[:, None]
+                membership = inverse[membership]
+                centers, counts = new_centers, new_counts
+            self.levels.append((centers, counts, membership))
+        self.levels.reverse()
+
+    @classmethod
+    def level_for_zoom(cls, zoom: float) -> Optional[int]:
+        """Index of the level to draw at this view zoom, None once the view is close enough for individual icons."""
+        if zoom > cls.ZOOM_LEVELS[-1]:
+            return None
+        return int(np.searchsorted(cls.ZOOM_LEVELS, zoom))
+
+    @classmethod
+    def for_label(cls, label_id: int) -> "ClusterPyramid":
+        if label_id not in cls._cache:
+            rows = PointStore.rows_for_labels([label_id])
+            cls._cache[label_id] = cls(PointStore.coords[rows])
+        return cls._cache[label_id]
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+
 
 class BasicGrouping:
     _comp_ico_pointers: Dict[int, List[CompositeIcon]] = {}
-    _group_boxes: List[QGraphicsRectItem] = []  # Keep track of group overlays
+    _group_overlay = None  # Single GroupOverlay item that paints every group box
+    _group_overlay_sample: Optional[CompositeIcon] = None
+    _linkage_cache: Dict[tuple, SingleLinkage] = {}
+    _marked: Optional[tuple] = None  # (obj_id, metric, min_samples) of the groups currently marked
+
+    # Matches the top of the grouping_threshold setting.
+    LINKAGE_MAX_DISTANCE = 1000.0
+    # A linkage covers this many times the distance it was built for, so a slider can move a bit before a rebuild.
+    LINKAGE_HEADROOM = 2.0
 
     def __init__(self):
         pass
 
+    # The count badge look, shared by the group boxes and the zoomed out cluster badges.
+    BADGE_COLOR = "blue"
+    BADGE_FILL = (0, 0, 255, 30)
+    BADGE_TEXT_COLOR = "black"
+
+    @classmethod
+    def badge_pen(cls) -> QPen:
+        pen = QPen(QColor(cls.BADGE_COLOR))
+        pen.setWidth(2)
+        return pen
+
+    @classmethod
+    def badge_brush(cls) -> QBrush:
+        return QBrush(QColor(*cls.BADGE_FILL))
+
+    @classmethod
+    def badge_font(cls) -> QFont:
+        return QFont("Arial", 14, QFont.Bold)
+
     @classmethod
     def save_object_point(cls, obj_id: int, comp_ico_pointer: CompositeIcon):
         cls._comp_ico_pointers[obj_id] = (
@@ -38,127 +324,129 @@ class BasicGrouping:
 
     @classmethod
     def clear_group_boxes(cls):
-        for box in cls._group_boxes:
-            if box.scene():
-                box.scene().removeItem(box)
-        cls._group_boxes.clear()
-        
+        if cls._group_overlay is not None:
+            cls._group_overlay.clear()
+        cls._group_overlay_sample = None
+
     @classmethod
-    def find_obj_group(cls, obj_id: int, num: int = 5, distance: int = 100, mark: bool = False) -> list:
-        def is_close(p1: QPointF, p2: QPointF) -> bool:
-            return (p1 - p2).manhattanLength() <= distance  # Faster approximation
+    def group_points(cls, label_ids: List[int], distance: float, metric: str = "manhattan",
+                     min_samples: int = 3, live: bool = False) -> List[np.ndarray]:
+        """
+        Groups the points of any labels straight from the PointStore, nothing has to be rendered for this.
+        Returns an array of PointStore rows per group, largest group first.
+        live: The distance is following a control (the grouping_threshold slider), so a cached SingleLinkage is
+        worth building. One off queries go straight to group_coordinates, which is far cheaper than the linkage.
+        """
+        rows = PointStore.rows_for_labels(label_ids)
+        if live and metric in ("manhattan", "euclidean") and distance <= cls.LINKAGE_MAX_DISTANCE:
+            group_ids = cls.linkage_for(label_ids, distance, metric).group_ids(distance)
+        else:
+            group_ids = group_coordinates(PointStore.coords[rows], distance, metric, min_samples)
+        return [rows[group] for group in split_groups(group_ids)]
 
+    @classmethod
+    def linkage_for(cls, label_ids: List[int], distance: float, metric: str = "manhattan") -> SingleLinkage:
+        """
+        A linkage good for distance and a bit past it. The candidate pairs grow with the square of max_distance,
+        so it's bounded by the distance asked for instead of always covering LINKAGE_MAX_DISTANCE.
+        """
+        key = (tuple(sorted(label_ids)), metric)
+        linkage = cls._linkage_cache.get(key)
+        if linkage is None or distance > linkage.max_distance:
+            rows = PointStore.rows_for_labels(key[0])
+            limit = min(cls.LINKAGE_MAX_DISTANCE, max(distance * cls.LINKAGE_HEADROOM, distance))
+            linkage = cls._linkage_cache[key] = SingleLinkage(PointStore.coords[rows], limit, metric)
+        return linkage
+
+    @classmethod
+    def clear_caches(cls):
+        cls._linkage_cache.clear()
+        ClusterPyramid.clear_cache()
+
+    @classmethod
+    def regroup(cls, distance: float):
+        """Re-marks whatever was last marked with a new distance, cheap enough to follow a slider live."""
+        if cls._marked is None:
+            return
+        obj_id, metric, min_samples = cls._marked
+        if not cls._comp_ico_pointers.get(obj_id):
+            cls._marked = None
+            cls.clear_group_boxes()
+            return
+        cls.find_obj_group(obj_id, distance=distance, mark=True, metric=metric, min_samples=min_samples, live=True)
+
+    @classmethod
+    def find_obj_group(cls, obj_id: int, num: int = 5, distance: int = 100, mark: bool = False,
+                       metric: str = "manhattan", min_samples: int = 3, live: bool = False) -> list:
         all_objs = cls._comp_ico_pointers.get(obj_id, [])
         if not all_objs:
             return []
 
         cls.clear_group_boxes()
-        visited = set()
-        icon_positions = {icon: icon.pos() for icon in all_objs}
-
-        # Grid hashing
-        cell_size = distance
-        grid = defaultdict(list)
-        for icon, pos in icon_positions.items():
-            key = (int(pos.x()) // cell_size, int(pos.y()) // cell_size)
-            grid[key].append(icon)
-
-        def get_neighbors(icon):
-            pos = icon_positions[icon]
-            cx, cy = int(pos.x()) // cell_size, int(pos.y()) // cell_size
-            for dx in (-1, 0, 1):
-                for dy in (-1, 0, 1):
-                    for neighbor in grid.get((cx + dx, cy + dy), []):
-                        if neighbor != icon and is_close(icon_positions[icon], icon_positions[neighbor]):
-                            yield neighbor
-
-        groups = []
-        for icon in all_objs:
-            if icon in visited:
-                continue
-            queue = [icon]
-            group = set()
-
-            while queue:
-                current = queue.pop()
-                if current in visited:
-                    continue
-                visited.add(current)
-                group.add(current)
-                queue.extend(n for n in get_neighbors(current) if n not in visited)
-
-            if len(group) >= 2:
-                groups.append(group)
-
-        merged = True
-        while merged:
-            merged = False
-            new_groups = []
-            while groups:
-                current = groups.pop()
-                for i, g in enumerate(groups):
-                    if any(is_close(icon_positions[a], icon_positions[b]) for a in current for b in g):
-                        current |= g
-                        groups.pop(i)
-                        merged = True
-                        break
-                new_groups.append(current)
-            groups = new_groups
-
-        groups = [list(g) for g in groups if g]
-        groups.sort(key=len, reverse=True)
+        icons_by_row = dict(zip(
+            PointStore.rows_for_point_ids(icon.item_data['id'] for icon in all_objs).tolist(), all_objs))
+
+        groups, row_groups = [], []
+        for rows in cls.group_points([obj_id], distance, metric, min_samples, live):
+            rendered = [row for row in rows.tolist() if row in icons_by_row]
+            if len(rendered) >= 2:
+                groups.append([icons_by_row[row] for row in rendered])
+                row_groups.append(np.asarray(rendered, dtype=np.int64))
 
         if mark:
+            cls._marked = (obj_id, metric, min_samples)
             for group in groups:
                 for icon in group:
                     icon.setSelected(True)
-                cls.mark_group(group)
+            cls.mark_groups(row_groups, all_objs[0])
+            from comment_prefetch import CommentPrefetcher
+            CommentPrefetcher.prefetch_markers(
+                (icon.item_data['id'], icon.item_data['label_id']) for group in groups for icon in group)
 
         return groups[:num] if not mark else groups
 
-
     @classmethod
-    def mark_group(cls, group: list):
-        positions = []
-        for icon in group:
-            base_scene_rect = icon.base_item.sceneBoundingRect()
-            overlay_scene_rect = icon.overlay_item.sceneBoundingRect()
-            combined_rect = base_scene_rect.united(overlay_scene_rect)
-            positions.append(combined_rect)
-
-
-        if not positions:
+    def mark_groups(cls, row_groups: List[np.ndarray], sample_icon: CompositeIcon):
+        """
+        Draws every group box through a single GroupOverlay item. Box bounds come from the PointStore anchors,
+        only one icon is asked for its on screen footprint since every icon of a label shares it.
+        """
+        from cluster_overlay import GroupOverlay
+        scene = sample_icon.scene()
+        if not row_groups or scene is None:
+            cls.clear_group_boxes()
             return
 
-        min_x = min(rect.left() for rect in positions)
-        min_y = min(rect.top() for rect in positions)
-        max_x = max(rect.right() for rect in positions)
-        max_y = max(rect.bottom() for rect in positions)
+        if cls._group_overlay is None:
+            cls._group_overlay = GroupOverlay()
+        if cls._group_overlay.scene() is not scene:
+            if cls._group_overlay.scene():
+                cls._group_overlay.scene().removeItem(cls._group_overlay)
+            scene.addItem(cls._group_overlay)
 
-        padding = 2
-        bounding_rect = QRectF(
-            min_x - padding, min_y - padding,
-            (max_x - min_x) + 2 * padding,
-            (max_y - min_y) + 2 * padding
-        )
+        counts = np.fromiter((len(rows) for rows in row_groups), dtype=np.int64, count=len(row_groups))
+        coords = PointStore.coords[np.concatenate(row_groups)]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        anchor_bounds = np.column_stack((
+            np.minimum.reduceat(coords[:, 0], starts), np.minimum.reduceat(coords[:, 1], starts),
+            np.maximum.reduceat(coords[:, 0], starts), np.maximum.reduceat(coords[:, 1], starts),
+        ))
 
-        rect_item = QGraphicsRectItem(bounding_rect)
-        pen = QPen(QColor("blue"))
-        pen.setWidth(2)
-        brush = QColor(0, 0, 255, 30)
-        rect_item.setPen(pen)
-        rect_item.setBrush(brush)
-        rect_item.setZValue(9999)
-
-        text = QGraphicsTextItem(str(len(group)))
-        text.setDefaultTextColor(QColor("black"))
-        text.setZValue(10000)
-        text.setFont(QFont("Arial", 14, QFont.Bold))
-        text.setPos(bounding_rect.topLeft() + QPointF(4, -20))  # Position slightly above the box
-
-        scene = group[0].scene()
-        if scene:
-            scene.addItem(rect_item)
-            scene.addItem(text)
-            cls._group_boxes.append(rect_item)
-            cls._group_boxes.append(text)
\ No newline at end of file
+        cls._group_overlay_sample = sample_icon
+        cls._group_overlay.set_groups(anchor_bounds, counts)
+        cls.refresh_group_overlay()
+
+    @classmethod
+    def refresh_group_overlay(cls):
+        """Icons change size with the zoom, so the boxes have to follow."""
+        icon = cls._group_overlay_sample
+        if cls._group_overlay is None or icon is None:
+            return
+        if icon.scene() is None:
+            cls.clear_group_boxes()
+            return
+        footprint = icon.base_item.sceneBoundingRect().united(icon.overlay_item.sceneBoundingRect())
+        anchor = icon.logical_anchor_pos
+        cls._group_overlay.set_marker_extent(
+            footprint.left() - anchor.x(), footprint.top() - anchor.y(),
+            footprint.right() - anchor.x(), footprint.bottom() - anchor.y())
@@ -1,4 +1,3 @@
-from difflib import get_close_matches
 from PyQt5.QtCore import Qt, QPointF, QPoint
 from PyQt5.QtGui import QPixmap, QFontMetrics, QIcon, QImage, QColor, QPainter, QPainterPath
 from PyQt5.QtWidgets import (
@@ -10,6 +9,7 @@ from typing import Dict, List, Union, Optional, Any, cast
 from functools import lru_cache
 
 from loaded_data import LoadedData
+from search_index import SearchIndex
 
 """
 These are 100% magic numbers, but before you get mad at me and say: "Gasp! Magic Numbers! The Horror!"
@@ -79,10 +79,8 @@ def gimmie_data(label_id: int) -> Dict[str, Optional[Any]]:
         None
     )
 
-    pos_data = [
-        point for point in full_data.get("point_list", [])
-        if cast(dict, point).get("label_id") == label_id
-    ]
+    from point_store import PointStore
+    pos_data = PointStore.points_for_label(label_id)
 
     return {
         "label": label_data,
@@ -132,13 +130,17 @@ def generate_id_to_oid_mapping(dataset1_path: str, dataset2_path: str, output_pa
     remaining_names = [
         name for name in name_to_oid if name_to_oid[name] not in used_oids]
 
+    remaining_index = SearchIndex()
+    for name in remaining_names:
+        remaining_index.add(name, name)
+
     still_unmatched = []
     for id_, name in unmatched_labels:
-        matches = get_close_matches(name, remaining_names, n=1, cutoff=0.5)
-        if matches:
-            best = matches[0]
+        best = remaining_index.best_match(name, cutoff=0.5)
+        if best is not None:
             id_to_oid[str(id_)] = name_to_oid[best]
             remaining_names.remove(best)
+            remaining_index.remove(best)
         else:
             still_unmatched.append((id_, name))
 
@@ -174,6 +176,35 @@ def transform_x_to_y(x: float) -> float:
     return a * x + b
 
 
+def map_label_ids_by_xpos(label_id: int, points_a: List[dict], points_b: List[list]) -> Dict[int, int]:
+    """
+    Maps the official ids of one label's points to unofficial ids, both sides sorted by x_pos (ties broken by y_pos)
+    and paired up in order.
+    """
+    converted = convert_id_or_oid(label_id)
+    if not isinstance(converted, str):
+        return {}
+    converted = converted.replace('btn-', '')
+
+    filtered_a = [p for p in points_a if p['label_id'] == label_id]
+    filtered_b = [r for r in points_b if len(
+        r) > 1 and r[1] == converted and r[2] == 2]  # My beloved
+    if not filtered_a or not filtered_b:
+        print(
+            f"[skip] No matches for label_id {label_id} -> {converted} (A: {len(filtered_a)}, B: {len(filtered_b)})")
+        return {}
+
+    sorted_a = sorted(filtered_a, key=lambda obj: (
+        obj['x_pos'], obj.get('y_pos', 0)))
+    sorted_b = sorted(filtered_b, key=lambda arr: arr[4])
+
+    if len(sorted_a) != len(sorted_b):
+        print(
+            f"[warning] Length mismatch for label_id {label_id}: A={len(sorted_a)}, B={len(sorted_b)}")
+
+    return {a_obj['id']: b_arr[0] for a_obj, b_arr in zip(sorted_a, sorted_b)}
+
+
 def map_all_ids_by_xpos(
     output_path: str = "application_data/map_object_mapping.json",
 ) -> Dict[int, int]:
@@ -188,29 +219,7 @@ def map_all_ids_by_xpos(
     label_ids = sorted({p['label_id'] for p in points_a})
 
     for label_id in label_ids:
-        converted = convert_id_or_oid(label_id)
-        if not isinstance(converted, str):
-            continue
-        converted = converted.replace('btn-', '')
-
-        filtered_a = [p for p in points_a if p['label_id'] == label_id]
-        filtered_b = [r for r in points_b if len(
-            r) > 1 and r[1] == converted and r[2] == 2]  # My beloved
-        if not filtered_a or not filtered_b:
-            print(
-                f"[skip] No matches for label_id {label_id} -> {converted} (A: {len(filtered_a)}, B: {len(filtered_b)})")
-            continue
-
-        sorted_a = sorted(filtered_a, key=lambda obj: (
-            obj['x_pos'], obj.get('y_pos', 0)))
-        sorted_b = sorted(filtered_b, key=lambda arr: arr[4])
-
-        if len(sorted_a) != len(sorted_b):
-            print(
-                f"[warning] Length mismatch for label_id {label_id}: A={len(sorted_a)}, B={len(sorted_b)}")
-
-        for i, (a_obj, b_arr) in enumerate(zip(sorted_a, sorted_b)):
-            full_mapping[a_obj['id']] = b_arr[0]
+        full_mapping.update(map_label_ids_by_xpos(label_id, points_a, points_b))
 
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(full_mapping, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class CachedResponse:
+    def __init__(self, url: str, status: int, headers: Dict[str, str], body: bytes,
+                 stored_at: float, fallback_ttl: float = 0):
+        self.url = url
+        self.status = status
+        self.headers = headers  # Lower case names
+        self.body = body
+        self.stored_at = stored_at
+        self.fallback_ttl = fallback_ttl
+        self.directives = self._parse_cache_control(headers.get("cache-control", ""))
+
+    @staticmethod
+    def _parse_cache_control(value: str) -> Dict[str, Optional[str]]:
+        directives = {}
+        for part in value.split(","):
+            name, _, arg = part.strip().partition("=")
+            if name:
+                directives[name.lower()] = arg.strip('"') if arg else None
+        return directives
+
+    def _seconds(self, directive: str) -> Optional[float]:
+        try:
+            return float(self.directives[directive])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.headers.get("last-modified")
+
+    @property
+    def storable(self) -> bool:
+        return "no-store" not in self.directives and 200 <= self.status < 300
+
+    def freshness_lifetime(self) -> float:
+        if "no-cache" in self.directives:
+            return 0
+        max_age = self._seconds("max-age")
+        if max_age is not None:
+            return max_age
+        if "expires" in self.headers:
+            try:
+                expires = parsedate_to_datetime(self.headers["expires"]).timestamp()
+                date = parsedate_to_datetime(self.headers["date"]).timestamp() if "date" in self.headers else self.stored_at
+                return max(0.0, expires - date)
+            except (TypeError, ValueError):
+                return 0
+        return self.fallback_ttl
+
+    def age(self, now: float) -> float:
+        try:
+            initial_age = float(self.headers.get("age", 0))
+        except ValueError:
+            initial_age = 0
+        return initial_age + max(0.0, now - self.stored_at)
+
+    def is_fresh(self, now: float) -> bool:
+        return self.age(now) < self.freshness_lifetime()
+
+    def is_within_stale_window(self, now: float) -> bool:
+        """True while stale-while-revalidate allows serving this and refreshing in the background."""
+        if "must-revalidate" in self.directives:
+            return False
+        window = self._seconds("stale-while-revalidate") or 0
+        return self.age(now) < self.freshness_lifetime() + window
+
+    def revalidation_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_meta(self) -> dict:
+        return {
+            "url": self.url,
+            "status": self.status,
+            "headers": self.headers,
+            "stored_at": self.stored_at,
+            "fallback_ttl": self.fallback_ttl,
+        }
+
+
+class ResponseCache:
+    """
+    Two tier HTTP cache, an in memory LRU in front of a directory of <sha256>.json (metadata) + <sha256>.bin (body).
+    Freshness follows Cache-Control / Expires, with a fallback ttl for servers that don't send either.
+    The memory tier changes right away, disk writes, removals and pruning queue up on a single worker thread in order.
+    """
+    _max_memory_entries = 128
+    _max_disk_entries = 2000
+    # Pruning goes a bit below the limit, so a full cache isn't listed and sorted again after every write.
+    _prune_headroom = 0.9
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="http_cache")
+    # Entries queued for writing, or None for ones queued for removal, so get() doesn't read what's about to change.
+    _pending: Dict[str, Optional[CachedResponse]] = {}
+    _pending_lock = threading.Lock()
+    _memory: "OrderedDict[str, CachedResponse]" = OrderedDict()
+    _directory = "application_data/http_cache"
+
+    @classmethod
+    def init(cls, directory: str = None):
+        if directory:
+            cls._directory = directory
+        os.makedirs(cls._directory, exist_ok=True)
+        cls._executor.submit(cls._prune_disk)
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _paths(cls, url: str) -> tuple[str, str]:
+        base = os.path.join(cls._directory, cls._key(url))
+        return base + ".json", base + ".bin"
+
+    @classmethod
+    def _remember(cls, entry: CachedResponse):
+        cls._memory[entry.url] = entry
+        cls._memory.move_to_end(entry.url)
+        if len(cls._memory) > cls._max_memory_entries:
+            cls._memory.popitem(last=False)
+
+    @classmethod
+    def get(cls, url: str) -> Optional[CachedResponse]:
+        entry = cls._memory.get(url)
+        if entry is not None:
+            cls._memory.move_to_end(url)
+            return entry
+        with cls._pending_lock:
+            if url in cls._pending:
+                return cls._pending[url]
+
+        meta_path, body_path = cls._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        entry = CachedResponse(url, meta["status"], meta["headers"], body, meta["stored_at"], meta.get("fallback_ttl", 0))
+        cls._remember(entry)
+        return entry
+
+    @classmethod
+    def store(cls, url: str, status: int, headers: Dict[str, str], body: bytes, fallback_ttl: float = 0) -> CachedResponse:
+        entry = CachedResponse(url, status, headers, body, time.time(), fallback_ttl)
+        if entry.storable:
+            cls._remember(entry)
+            cls._queue(url, entry, cls._write, entry)
+        else:
+            cls.evict(url)  # Whatever was cached before is no longer what the server serves
+        return entry
+
+    @classmethod
+    def evict(cls, url: str):
+        cls._memory.pop(url, None)
+        cls._queue(url, None, cls._remove, *cls._paths(url))
+
+    @classmethod
+    def _queue(cls, url: str, pending: Optional[CachedResponse], job, *args):
+        with cls._pending_lock:
+            cls._pending[url] = pending
+
+        def run():
+            try:
+                job(*args)
+            finally:
+                with cls._pending_lock:
+                    if url in cls._pending and cls._pending[url] is pending:
+                        del cls._pending[url]
+
+        cls._executor.submit(run)
+
+    @classmethod
+    def revalidated(cls, entry: CachedResponse, headers: Dict[str, str]) -> CachedResponse:
+        """A 304 came back, keep the body and take the fresh validators and freshness headers."""
+        merged = dict(entry.headers)
+        merged.update(headers)
+        if "age" not in headers:
+            merged.pop("age", None)
+        return cls.store(entry.url, entry.status, merged, entry.body, entry.fallback_ttl)
+
+    @classmethod
+    def _write(cls, entry: CachedResponse):
+        meta_path, body_path = cls._paths(entry.url)
+        try:
+            os.makedirs(cls._directory, exist_ok=True)
+            with open(body_path + ".tmp", "wb") as f:
+                f.write(entry.body)
+            os.replace(body_path + ".tmp", body_path)
+            with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(entry.to_meta(), f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError as e:
+            print(f"[warn] Failed to write http cache entry for {entry.url}: {e}")
+            return
+        cls._prune_disk()
+
+    @staticmethod
+    def _remove(*paths: str):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @classmethod
+    def _prune_disk(cls):
+        """Drops the least recently written entries once there are more than _max_disk_entries. Runs on the executor."""
+        try:
+            metas = [os.path.join(cls._directory, f) for f in os.listdir(cls._directory) if f.endswith(".json")]
+        except OSError:
+            return
+        if len(metas) <= cls._max_disk_entries:
+            return
+
+        def mtime(path: str) -> float:
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        metas.sort(key=mtime)
+        for meta_path in metas[:len(metas) - int(cls._max_disk_entries * cls._prune_headroom)]:
+            cls._remove(meta_path, meta_path[:-len(".json")] + ".bin")
+
+    @classmethod
+    def clear(cls):
+        cls._memory.clear()
+        with cls._pending_lock:
+            cls._pending.clear()
+        cls._executor.submit(cls._clear_disk).result()
+
+    @classmethod
+    def _clear_disk(cls):
+        try:
+            for filename in os.listdir(cls._directory):
+                os.remove(os.path.join(cls._directory, filename))
+        except OSError:
+            pass
@@ -0,0 +1,300 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QPoint, pyqtSignal
+from PyQt5.QtGui import QPainter, QColor, QFont, QFontMetrics, QPixmap, QPen, QMouseEvent
+from PyQt5.QtWidgets import (
+    QListView, QStyledItemDelegate, QStyleOptionViewItem, QAbstractItemView, QMenu, QAction, QWidget
+)
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from loaded_data import LoadedData
+from settings import SettingsManager
+from theme import Theme
+
+LabelEntry = Tuple[int, str]  # label id, label name
+
+
+class LabelGridModel(QAbstractListModel):
+    """
+    Every category of get_all_ids() flattened into rows, a header row with the category name followed by rows of
+    up to COLUMNS labels. header_rows[i] is the row of the i-th category's header.
+    """
+    RowRole = Qt.ItemDataRole.UserRole + 1
+    HEADER = 0
+    LABELS = 1
+    COLUMNS = 3
+
+    def __init__(self, categories: Dict[str, List[Sequence[Union[int, str]]]], parent=None):
+        super().__init__(parent)
+        self.rows: List[Tuple[int, Union[str, List[LabelEntry]]]] = []
+        self.header_rows: List[int] = []
+        self.label_rows: Dict[int, int] = {}  # label id -> row
+        for name, labels in categories.items():
+            self.header_rows.append(len(self.rows))
+            self.rows.append((self.HEADER, name))
+            for start in range(0, len(labels), self.COLUMNS):
+                entries = [(int(item[0]), str(item[1])) for item in labels[start:start + self.COLUMNS]]
+                for label_id, _ in entries:
+                    self.label_rows[label_id] = len(self.rows)
+                self.rows.append((self.LABELS, entries))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        kind, value = self.rows[index.row()]
+        if role == self.RowRole:
+            return kind, value
+        if role == Qt.ItemDataRole.DisplayRole:
+            return value if kind == self.HEADER else ", ".join(name for _, name in value)
+        return None
+
+    def label_changed(self, label_id: int):
+        row = self.label_rows.get(label_id)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+
+class LabelGridDelegate(QStyledItemDelegate):
+    """Paints a header row or a row of label cells, each cell looking like the old ClickableIcon."""
+    HEADER_HEIGHT = 34
+    CELL_HEIGHT = 140
+    CELL_SPACING = 10
+    ICON_SIZE = 64
+    CELL_PADDING = 6
+    MAX_FONT_SIZE = 12
+    MIN_FONT_SIZE = 6
+
+    def __init__(self, view: "LabelGridView"):
+        super().__init__(view)
+        self.view = view
+        self.header_font = QFont()
+        self.header_font.setBold(True)
+        self._icons: Dict[int, QPixmap] = {}  # Scaled once, the first time a label is painted
+        self._fonts: Dict[Tuple[int, int], QFont] = {}  # (label id, text width) -> font that fits
+
+    def clear_layout_cache(self):
+        self._fonts.clear()
+
+    def cell_rects(self, rect: QRect, count: int) -> List[QRect]:
+        columns = LabelGridModel.COLUMNS
+        width = (rect.width() - (columns + 1) * self.CELL_SPACING) // columns
+        return [QRect(rect.x() + self.CELL_SPACING + i * (width + self.CELL_SPACING), rect.y() + self.CELL_SPACING // 2,
+                      width, self.CELL_HEIGHT) for i in range(count)]
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        kind, _ = index.data(LabelGridModel.RowRole)
+        width = self.view.viewport().width()
+        if kind == LabelGridModel.HEADER:
+            return QSize(width, self.HEADER_HEIGHT)
+        return QSize(width, self.CELL_HEIGHT + self.CELL_SPACING)
+
+    def _icon(self, label_id: int) -> Optional[QPixmap]:
+        if label_id not in self._icons:
+            pixmap = LoadedData.btn_pixmaps.get(label_id)
+            if pixmap is not None and not pixmap.isNull():
+                pixmap = pixmap.scaled(self.ICON_SIZE, self.ICON_SIZE, Qt.AspectRatioMode.KeepAspectRatio,
+                                       Qt.TransformationMode.SmoothTransformation)
+            self._icons[label_id] = pixmap
+        return self._icons[label_id]
+
+    def _font(self, label_id: int, text: str, rect: QRect) -> QFont:
+        key = (label_id, rect.width())
+        font = self._fonts.get(key)
+        if font is None:
+            font = QFont()
+            size = self.MAX_FONT_SIZE
+            while size > self.MIN_FONT_SIZE:
+                font.setPointSize(size)
+                bounds = QFontMetrics(font).boundingRect(QRect(0, 0, rect.width(), 100000), Qt.TextFlag.TextWordWrap, text)
+                if bounds.height() <= rect.height() and bounds.width() <= rect.width():
+                    break
+                size -= 1
+            font.setPointSize(size)
+            self._fonts[key] = font
+        return font
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        kind, value = index.data(LabelGridModel.RowRole)
+        painter.save()
+        text_color = Theme.color("text")
+        if kind == LabelGridModel.HEADER:
+            painter.fillRect(option.rect, Theme.color("header"))
+            painter.setFont(self.header_font)
+            painter.setPen(text_color)
+            painter.drawText(option.rect.adjusted(self.CELL_SPACING, 0, -self.CELL_SPACING, 0),
+                             Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, value)
+            painter.restore()
+            return
+
+        painter.fillRect(option.rect, Theme.color("header"))
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        selected_ids = self.view.selected_ids()
+        for (label_id, name), cell in zip(value, self.cell_rects(option.rect, len(value))):
+            selected = label_id in selected_ids
+            hovered = self.view.hovered_label == label_id
+            if label_id == self.view.current_match:
+                painter.setPen(QPen(QColor(255, 215, 0, 230), 2))
+                painter.setBrush(QColor("#31a207") if selected else QColor(255, 215, 0, 25))
+            elif selected:
+                painter.setPen(QPen(QColor("green"), 2))
+                painter.setBrush(QColor("#31a207"))
+            elif hovered or label_id in self.view.search_matches:
+                painter.setPen(QPen(QColor(255, 255, 255, 180), 1))
+                painter.setBrush(QColor(255, 255, 255, 10))
+            else:
+                painter.setPen(QPen(QColor(200, 200, 200, 100), 1))
+                painter.setBrush(Qt.BrushStyle.NoBrush)
+            painter.drawRoundedRect(cell.adjusted(1, 1, -1, -1), 5, 5)
+
+            inner = cell.adjusted(self.CELL_PADDING, self.CELL_PADDING, -self.CELL_PADDING, -self.CELL_PADDING)
+            icon = self._icon(label_id)
+            if icon is not None and not icon.isNull():
+                painter.drawPixmap(inner.x() + (inner.width() - icon.width()) // 2, inner.y(), icon)
+
+            text_rect = QRect(inner.x(), inner.y() + self.ICON_SIZE + 10, inner.width(),
+                              inner.height() - self.ICON_SIZE - 10)
+            painter.setFont(self._font(label_id, name, text_rect))
+            painter.setPen(QColor(200, 200, 200, 255) if selected else text_color)
+            painter.drawText(text_rect, Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop | Qt.TextFlag.TextWordWrap,
+                             name)
+        painter.restore()
+
+    def label_at(self, rect: QRect, entries: List[LabelEntry], pos: QPoint) -> Optional[int]:
+        for (label_id, _), cell in zip(entries, self.cell_rects(rect, len(entries))):
+            if cell.contains(pos):
+                return label_id
+        return None
+
+
+class LabelGridView(QListView):
+    """
+    The Location Data grid. Only the rows on screen are painted and label icons are scaled the first time they are,
+    so building the panel doesn't depend on how many labels there are.
+    Left click toggles a label, right click selects it and opens the Find Groups / Delete menu,
+    right clicking a category header emits category_menu_requested.
+    """
+    category_menu_requested = pyqtSignal(int, QPoint)  # category index, global position
+
+    _shared_menu = None
+    _action_groups = None
+    _action_delete = None
+
+    def __init__(self, categories: Dict[str, List[Sequence[Union[int, str]]]], toggle_callback: Callable[[int], None],
+                 selected_ids: Callable[[], List[int]], map_view, parent: QWidget = None):
+        super().__init__(parent)
+        self.grid_model = LabelGridModel(categories, self)
+        self.delegate = LabelGridDelegate(self)
+        self.toggle_callback = toggle_callback
+        self.selected_ids = selected_ids
+        self.map_view = map_view
+        self.hovered_label: Optional[int] = None
+        self.search_matches: Set[int] = set()
+        self.current_match: Optional[int] = None
+        self.setModel(self.grid_model)
+        self.setItemDelegate(self.delegate)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setUniformItemSizes(False)
+        self.setMouseTracking(True)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self._init_shared_menu()
+
+    @classmethod
+    def _init_shared_menu(cls):
+        if cls._shared_menu is None:
+            cls._shared_menu = QMenu()
+            cls._action_groups = QAction("Find Groups")
+            cls._action_delete = QAction("Delete")
+            cls._shared_menu.addAction(cls._action_groups)
+            cls._shared_menu.addAction(cls._action_delete)
+
+    def resizeEvent(self, event):
+        self.delegate.clear_layout_cache()
+        super().resizeEvent(event)
+
+    def label_at(self, pos: QPoint) -> Optional[int]:
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return None
+        kind, value = index.data(LabelGridModel.RowRole)
+        if kind != LabelGridModel.LABELS:
+            return None
+        return self.delegate.label_at(self.visualRect(index), value, pos)
+
+    def label_changed(self, label_id: int):
+        self.grid_model.label_changed(label_id)
+
+    def scroll_to_category(self, category_idx: int):
+        row = self.grid_model.header_rows[category_idx]
+        self.scrollTo(self.grid_model.index(row), QAbstractItemView.ScrollHint.PositionAtTop)
+
+    def scroll_to_label(self, label_id: int):
+        row = self.grid_model.label_rows.get(label_id)
+        if row is not None:
+            self.scrollTo(self.grid_model.index(row), QAbstractItemView.ScrollHint.PositionAtCenter)
+
+    def set_search_results(self, label_ids: List[int]):
+        """Outlines the labels matching a search and scrolls to the best one."""
+        changed = self.search_matches | set(label_ids)
+        if self.current_match is not None:
+            changed.add(self.current_match)
+        self.search_matches = set(label_ids)
+        self.current_match = label_ids[0] if label_ids else None
+        for label_id in changed:
+            self.grid_model.label_changed(label_id)
+        if self.current_match is not None:
+            self.scroll_to_label(self.current_match)
+
+    def mouseMoveEvent(self, event: QMouseEvent):
+        label_id = self.label_at(event.pos())
+        if label_id != self.hovered_label:
+            previous, self.hovered_label = self.hovered_label, label_id
+            for changed in (previous, label_id):
+                if changed is not None:
+                    self.grid_model.label_changed(changed)
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        if self.hovered_label is not None:
+            previous, self.hovered_label = self.hovered_label, None
+            self.grid_model.label_changed(previous)
+        super().leaveEvent(event)
+
+    def category_at(self, pos: QPoint) -> Optional[int]:
+        index = self.indexAt(pos)
+        if not index.isValid() or index.data(LabelGridModel.RowRole)[0] != LabelGridModel.HEADER:
+            return None
+        return self.grid_model.header_rows.index(index.row())
+
+    def mousePressEvent(self, event: QMouseEvent):
+        label_id = self.label_at(event.pos())
+        if label_id is None:
+            category_idx = self.category_at(event.pos())
+            if category_idx is not None and event.button() == Qt.MouseButton.RightButton:
+                self.category_menu_requested.emit(category_idx, event.globalPos())
+                return
+            super().mousePressEvent(event)
+            return
+
+        if event.button() == Qt.MouseButton.RightButton:
+            if label_id not in self.selected_ids():
+                self.toggle_callback(label_id)
+            self._action_groups.triggered.connect(
+                lambda: self.find_obj_groups(
+                    label_id, num_of_groups=999, distance=SettingsManager.get_setting_value('grouping_threshold'), mark=True)
+            )
+            self._shared_menu.exec_(event.globalPos())
+            self._action_groups.triggered.disconnect()
+        else:
+            self.toggle_callback(label_id)
+
+    def find_obj_groups(self, label_id: int, num_of_groups: int = 50, distance=10, mark: bool = False):
+        from grouping import BasicGrouping
+        groups = BasicGrouping.find_obj_group(
+            label_id, distance=distance, num=num_of_groups, mark=mark
+        )
+        if groups:
+            self.map_view.centerOn(groups[0][0].pos())
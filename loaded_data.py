@@ -64,6 +64,10 @@ class LoadedData:
                 except Exception as e:
                     print(f"[error] Unexpected error during JSON loading: {e}")
 
+        if cls.official_dataset:
+            from point_store import PointStore
+            PointStore.build(cls.official_dataset.get("point_list", []))
+
         image_tasks = []
         with ThreadPoolExecutor() as executor:
             image_tasks.append(executor.submit(cls.load_map_images_async, "images/map/official/high_res/"))
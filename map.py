@@ -2,14 +2,17 @@ from PyQt5.QtWidgets import QWidget, QHBoxLayout
 import sys
 import os
 import random
-from PyQt5.QtCore import Qt, QRectF, QTimer, QPointF
+from PyQt5.QtCore import Qt, QRectF, QTimer, QPointF, QPoint
 from PyQt5.QtGui import QPixmap, QPainter, QBrush, QPen, QImage, QColor, QKeySequence, QWheelEvent, QResizeEvent
 from PyQt5.QtWidgets import QApplication, QMainWindow, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsEllipseItem, QShortcut, QProxyStyle
 import asyncio
 from qasync import QEventLoop
+import numpy as np
+from typing import List
 
-from helpers import original_pos_to_pyqt5, gimmie_data, generate_id_to_oid_mapping, delete_single_color_or_transparent_images
-from grouping import BasicGrouping
+from helpers import generate_id_to_oid_mapping, delete_single_color_or_transparent_images
+from grouping import BasicGrouping, ClusterPyramid
+from cluster_overlay import ClusterOverlay
 from composite_icon import CompositeIcon
 from menu import ButtonPanel
 from alerts import AlertsManager
@@ -18,6 +21,9 @@ from updater import Updater
 from loading_window import LoadingWindow
 from settings import SettingsManager
 from async_requests import AsyncRequests
+from vote_outbox import VoteOutbox
+from selection_store import MarkerLayout, SelectionStore
+from data_sync import DataSync
 
 class MapViewer(QGraphicsView):
 
@@ -34,8 +40,12 @@ class MapViewer(QGraphicsView):
         self.max_zoom = 3.0
         self.current_zoom = 1.0
         self.composite_icons = {}
+        self.cluster_level = None
+        self.cluster_overlay = ClusterOverlay(self.min_zoom)
+        scene.addItem(self.cluster_overlay)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        SettingsManager.subscribe('grouping_threshold', BasicGrouping.regroup)
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.get_new_ids)
         self.timer.start(500)
@@ -53,37 +63,67 @@ class MapViewer(QGraphicsView):
         image.save("entire_map_screenshot.png")
         print("Screenshot saved as 'entire_map_screenshot.png'")
 
+    # Markers added between progress updates while loading, each update repaints the alert.
+    LOAD_BATCH_SIZE = 250
+
     def load_id(self, _id: int):
-        data = gimmie_data(_id)
-        self.current_loaded_ids.append(_id)
-        icos = []
-        levels = set()
-        data_len = len(data['point'])
-        for i, point in enumerate(data['point']):
-            levels.add(point['z_level'])
-            new_pos = original_pos_to_pyqt5(point['x_pos'], point['y_pos'])
-            image_path = f"images/resources/official/{data['label']['id']}.jpg"
-            AlertsManager.create_alert(
-                f"Loading", image_path, i, data_len-1, True, 250)
-            comps_ico = CompositeIcon("images/map/official/icons/high_res/arrow_pointer.png" if point['z_level'] ==
-                                      0 else "images/map/official/icons/high_res/underground_arrow_pointer.png", image_path, new_pos, point, zoom_level=self.current_zoom)
-            comps_ico.scale_adjust_zoom(self.current_zoom)
-            BasicGrouping.save_object_point(_id, comps_ico)
-            icos.append(comps_ico)
-            self.scene().addItem(comps_ico)
-            QApplication.processEvents()
-        self.composite_icons[_id] = icos
+        self.load_ids([_id])
+
+    def load_ids(self, ids: List[int]):
+        """
+        Adds the markers of every label in ids as one job, laid out by a single PointStore query. The scene gets them
+        with updates held off and there is one progress alert for the lot.
+        """
+        ids = [_id for _id in ids if _id not in self.current_loaded_ids]
+        if not ids:
+            return
+        layout = MarkerLayout.from_store(ids)
+        total = len(layout)
+        image_path = f"images/resources/official/{ids[0]}.jpg"
+        text = "Loading" if len(ids) == 1 else f"Loading {len(ids)} labels"
+
+        for _id in ids:
+            self.current_loaded_ids.append(_id)
+            self.composite_icons[_id] = []
+        self.setUpdatesEnabled(False)
+        try:
+            for row in range(total):
+                label_id = int(layout.label_ids[row])
+                comps_ico = CompositeIcon(layout.images[layout.base_refs[row]], layout.images[layout.overlay_refs[row]],
+                                          QPoint(*layout.positions[row].tolist()), layout.points[row],
+                                          zoom_level=self.current_zoom)
+                comps_ico.scale_adjust_zoom(self.current_zoom)
+                BasicGrouping.save_object_point(label_id, comps_ico)
+                self.composite_icons[label_id].append(comps_ico)
+                self.scene().addItem(comps_ico)
+                if row % self.LOAD_BATCH_SIZE == 0:
+                    AlertsManager.create_alert(text, image_path, row, max(total - 1, 1), True, 250)
+                    QApplication.processEvents()
+        finally:
+            self.setUpdatesEnabled(True)
+        AlertsManager.create_alert(text, image_path, total, max(total, 1), True, 1000)
+        self.update_clusters(force=True)
+        SelectionStore.schedule_save()
+
+    def unload_ids(self, ids: List[int]):
+        for _id in ids:
+            if _id not in self.current_loaded_ids:
+                continue
+            BasicGrouping.remove_object_points(_id)
+            self.current_loaded_ids.remove(_id)
+            for ico in self.composite_icons.pop(_id, []):
+                self.scene().removeItem(ico)
+        self.update_clusters(force=True)
+        SelectionStore.schedule_save()
 
     def get_new_ids(self):
-        for thing in self.current_loaded_ids[:]:
-            if thing not in ButtonPanel.selected_ids:
-                BasicGrouping.remove_object_points(thing)
-                self.current_loaded_ids.remove(thing)
-                for ico in self.composite_icons[thing]:
-                    self.scene().removeItem(ico)
-        for thing in ButtonPanel.selected_ids:
-            if thing not in self.current_loaded_ids:
-                self.load_id(thing)
+        selected = set(ButtonPanel.selected_ids)
+        removed = [_id for _id in self.current_loaded_ids if _id not in selected]
+        if removed:
+            self.unload_ids(removed)
+        added = [_id for _id in ButtonPanel.selected_ids if _id not in self.current_loaded_ids]
+        if added:
+            self.load_ids(added)
 
     def wheelEvent(self, event:QWheelEvent):
         factor = 1.2 if event.angleDelta().y() > 0 else 0.8
@@ -97,6 +137,39 @@ class MapViewer(QGraphicsView):
             self.composite_icons.values()) for item in sublist]
         for ico in list_ico:
             ico.scale_adjust_zoom(self.current_zoom)
+        BasicGrouping.refresh_group_overlay()
+        self.update_clusters()
+
+    def update_clusters(self, force: bool = False):
+        """
+        Swaps individual icons for count badges while zoomed out, using each label's precomputed ClusterPyramid.
+        Icons that are alone in their cluster stay visible, everything else is hidden behind a badge.
+        """
+        level = ClusterPyramid.level_for_zoom(self.current_zoom)
+        if level == self.cluster_level and not force:
+            return
+        self.cluster_level = level
+
+        centers, counts = [], []
+        for label_id, icos in self.composite_icons.items():
+            if level is None:
+                for ico in icos:
+                    ico.setVisible(True)
+                continue
+            label_centers, label_counts, membership = ClusterPyramid.for_label(label_id).levels[level]
+            if len(membership) != len(icos):
+                continue
+            alone = (label_counts[membership] == 1).tolist()
+            for ico, show in zip(icos, alone):
+                ico.setVisible(show)
+            grouped = label_counts > 1
+            centers.append(label_centers[grouped])
+            counts.append(label_counts[grouped])
+
+        if centers:
+            self.cluster_overlay.set_badges(np.concatenate(centers), np.concatenate(counts))
+        else:
+            self.cluster_overlay.clear()
 
     def plot_origin(self, scene_pos: QPointF):
         radius = 5
@@ -121,10 +194,10 @@ class MainWindow(QMainWindow):
         
         loading_window.update_text('Connecting...', random.randrange(6,10), 100)
         AsyncRequests.init(self)
+        VoteOutbox.init()
         
-        if (SettingsManager.get_setting_value('auto_update')):
-            loading_window.update_text('Checking for updates...', random.randrange(11,16), 100)
-            Updater.check_for_updates()
+        loading_window.update_text('Applying updates...', random.randrange(11,16), 100)
+        Updater.apply_staged()
         
         # Instant tooltips, not presently used, but definitely worth having. 
         # PyQt5's builtin tooltip speed is an incredibly slow 700ms.
@@ -176,6 +249,9 @@ class MainWindow(QMainWindow):
         self.btn.move(0, 0)  
         self.btn.hide()
 
+        # Picked up once the event loop runs, the dataset hash and the saved state are read off the GUI thread.
+        SelectionStore.schedule_restore(self.map_view)
+
         container = QWidget()
         layout = QHBoxLayout(container)
         layout.setContentsMargins(0, 0, 0, 0)
@@ -186,6 +262,11 @@ class MainWindow(QMainWindow):
         loading_window = None
         self.setCentralWidget(container)
 
+        # Checked once the window is up. App updates are staged and applied next start, new map points are merged live.
+        if (SettingsManager.get_setting_value('auto_update')):
+            QTimer.singleShot(0, Updater.schedule_check)
+            QTimer.singleShot(0, DataSync.schedule_sync)
+
     def toggle_panel(self):
         self.btn.setVisible(not self.btn.isVisible())
         self.btn.raise_()
@@ -1,18 +1,20 @@
 import os
-from PyQt5.QtCore import Qt, QSize, QThread
-from PyQt5.QtGui import QPixmap, QFont, QIcon
+from PyQt5.QtCore import Qt, QSize, QPoint
+from PyQt5.QtGui import QPixmap, QIcon
 from PyQt5.QtWidgets import (
-    QWidget, QGridLayout, QLabel, QScrollArea,
-    QVBoxLayout, QHBoxLayout, QPushButton,
+    QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QMenu,
     QToolButton, QMainWindow, QSizePolicy
 )
-from typing import List, Union, Tuple, Sequence, Optional
+from typing import Iterable, List, Optional
 
 from helpers import get_all_ids
-from menu_button import ClickableIcon
+from label_grid import LabelGridView
+from search_index import LabelSearch
 from comment_card import CommentCard
+from comment_list import CommentListView
 from loaded_data import LoadedData
 from settings import SettingsManager
+from theme import Theme
 
 class ButtonPanel(QWidget):
     selected_ids: list[int] = []
@@ -68,13 +70,32 @@ class ButtonPanel(QWidget):
         self.menu_layout = QVBoxLayout()
         location_layout.addLayout(self.menu_layout, 1)
 
-        self.content_scroll_area = QScrollArea()
-        self.content_scroll_area.setWidgetResizable(True)
-        self.content_container_widget = QWidget()
-        self.content_container_widget.setObjectName('ContentContainer')
-        self.content_layout_inside = QVBoxLayout(self.content_container_widget)
-        self.content_scroll_area.setWidget(self.content_container_widget)
-        location_layout.addWidget(self.content_scroll_area, 3)
+        grid_layout = QVBoxLayout()
+        self.search_box = QLineEdit()
+        self.search_box.setObjectName('LabelSearch')
+        self.search_box.setPlaceholderText("Search...")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.on_search)
+        self.search_box.returnPressed.connect(self.toggle_search_match)
+        grid_layout.addWidget(self.search_box)
+
+        selection_bar = QHBoxLayout()
+        selection_bar.setSpacing(2)
+        for text, handler in (("Select Matches", self.select_search_matches),
+                              ("Invert", lambda: self.invert_selection()),
+                              ("Clear", self.clear_selection)):
+            button = QPushButton(text)
+            button.setObjectName('LocationMenuButton')
+            button.clicked.connect(lambda _, handler=handler: handler())
+            selection_bar.addWidget(button)
+        grid_layout.addLayout(selection_bar)
+
+        self.label_grid = LabelGridView(LoadedData.all_official_ids, self.toggle_selection,
+                                        lambda: self.selected_ids, self.window_view.map_view)
+        self.label_grid.setObjectName('ContentContainer')
+        self.label_grid.category_menu_requested.connect(self.show_category_menu)
+        grid_layout.addWidget(self.label_grid)
+        location_layout.addLayout(grid_layout, 3)
 
         self.views["Location Data"] = self.location_view
 
@@ -85,18 +106,9 @@ class ButtonPanel(QWidget):
         self.web_view.setObjectName('WebView')
         web_layout = QVBoxLayout(self.web_view)
 
-        self.web_scroll = QScrollArea()
-        self.web_scroll.setWidgetResizable(True)
-
-        self.web_content = QWidget()
-        self.web_layout_inside = QVBoxLayout(self.web_content)
-        self.web_content.setObjectName('WebContent')
-        self.web_layout_inside.setContentsMargins(8, 8, 8, 8)
-        self.web_layout_inside.setSpacing(12)
-        self.web_content.setLayout(self.web_layout_inside)
-        self.web_scroll.setWidget(self.web_content)
-
-        web_layout.addWidget(self.web_scroll)
+        self.comment_list = CommentListView()
+        self.comment_list.setObjectName('WebContent')
+        web_layout.addWidget(self.comment_list)
         self.views["Web"] = self.web_view
 
 
@@ -123,15 +135,11 @@ class ButtonPanel(QWidget):
 
 
         self.ids = LoadedData.all_official_ids
-        self.section_widgets = {}
-        self.content_scroll_area.setHorizontalScrollBarPolicy(
-            Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.web_scroll.setHorizontalScrollBarPolicy(
+        self.comment_list.setHorizontalScrollBarPolicy(
             Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.content_scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        
-        
-        for idx, (key, value) in enumerate(self.ids.items()):
+        self.label_grid.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+
+        for idx, key in enumerate(self.ids):
             menu_button = QPushButton(key)
             menu_button.setObjectName('LocationMenuButton')
             menu_button.setContentsMargins(0, 0, 0, 0)
@@ -139,138 +147,99 @@ class ButtonPanel(QWidget):
                 lambda _, idx=idx: self.scroll_to_group(idx))
             self.menu_layout.addWidget(menu_button)
 
-            section = self.create_group_section(key, value)
-            self.section_widgets[idx] = section
-            self.content_layout_inside.addWidget(section)
-            
-            
-        self.setStyleSheet("""
-            QWidget {
-                color: rgba(255, 255, 255, 200);
-            }
-            QLabel, QPushButton, QToolButton {
-                color: rgba(255, 255, 255, 200);
-            }
-            QScrollArea {
-                background-color: transparent;
-            }
-            QScrollBar:horizontal {
-                height: 0px;
-            }  
-            #LocationMenuButton {
-                background-color: rgba(60, 60, 60, 255);
-                border: 1px solid black;
-                margin: 0px;
-                padding: 8px 12px;
-                color: rgba(255, 255, 255, 200);
-                font-weight: bold;
-            }
-
-            #LocationMenuButton:hover {
-                background-color: rgba(60, 60, 60, 255);
-                border: 1px solid white;  
-            }
-            QScrollBar:vertical, QScrollBar:horizontal {
-                width: 0px;
-                height: 0px;
-                background: transparent;
-            }
-            #NavButton {
-                background-color: rgba(60, 60, 60, 255);
-                border: 1px solid black;
-            }
-            #NavButton:hover {
-                background-color: rgba(40, 40, 40, 255);
-                border: 1px solid white;
-            }
-            #WebView, #WebContent, #ContentContainer, #SettingsView {
-                background-color: rgba(60, 60, 60, 255);
-            }
-        """)
+        Theme.init(self)
+        Theme.set_property(self.nav_buttons["Location Data"], "selected", True)
 
 
     def on_nav_clicked(self, name: str):
         for view in self.views.values():
             view.hide()
         self.views[name].show()
+        for button_name, button in self.nav_buttons.items():
+            Theme.set_property(button, "selected", button_name == name)
 
-    def create_group_section(
-        self, group_name: str, data: List[Union[Tuple[str, str], Sequence[str]]]
-    ) -> QWidget:
-        section_widget = QWidget()
-        section_layout = QVBoxLayout()
-        section_widget.setObjectName('SectionWidget')
-        section_widget.setStyleSheet("""
-            #SectionWidget {
-                background-color: rgba(40,40,40,200)
-            }                           
-        """)
-        b_f = QFont()
-        b_f.setBold(True)
-        title_label = QLabel(group_name)
-        title_label.setFont(b_f)
-        section_layout.addWidget(title_label)
-
-        grid_layout = QGridLayout()
-        grid_layout.setSpacing(10)
-        for i, item in enumerate(data):
-            row, col = divmod(i, 3)
-
-            pixmap = LoadedData.btn_pixmaps.get(int(item[0]))
-            button = ClickableIcon(
-                item[0], item[1],
-                pixmap,
-                self.toggle_selection,
-                parent=self.window_view.map_view
-            )
-            button.setMinimumSize(80, 80) 
-            button.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
-
-            grid_layout.addWidget(button, row, col)
-            grid_layout.setRowStretch(row, 1)     
-            grid_layout.setColumnStretch(col, 1)
-            grid_layout.addWidget(button, row, col)
-        section_layout.addLayout(grid_layout)
-        section_widget.setLayout(section_layout)
-        return section_widget
-
-    def toggle_selection(self, id: int, widget: ClickableIcon) -> None:
+    def toggle_selection(self, id: int) -> None:
         if id in self.selected_ids:
             self.selected_ids.remove(id)
-            widget.set_selected(False)
         else:
             self.selected_ids.append(id)
-            widget.set_selected(True)
+        self.label_grid.label_changed(id)
+
+    def category_ids(self, group_idx: int) -> List[int]:
+        return [int(item[0]) for item in list(self.ids.values())[group_idx]]
+
+    def set_selection(self, ids: Iterable[int], selected: bool = True) -> None:
+        """Selects or deselects many labels at once, the map loads (or drops) them as one batch."""
+        current = set(self.selected_ids)
+        for id in ids:
+            if selected and id not in current:
+                self.selected_ids.append(id)
+                current.add(id)
+            elif not selected and id in current:
+                self.selected_ids.remove(id)
+                current.discard(id)
+        self._selection_changed()
+
+    def select_category(self, group_idx: int, selected: bool = True) -> None:
+        self.set_selection(self.category_ids(group_idx), selected)
+
+    def select_search_matches(self) -> None:
+        self.set_selection(self.label_grid.search_matches)
+
+    def invert_selection(self, group_idx: Optional[int] = None) -> None:
+        """Inverts one category, or every label when no category is given."""
+        if group_idx is None:
+            ids = [id for idx in range(len(self.ids)) for id in self.category_ids(idx)]
+        else:
+            ids = self.category_ids(group_idx)
+        current = set(self.selected_ids)
+        self.selected_ids[:] = [id for id in self.selected_ids if id not in ids] + [id for id in ids if id not in current]
+        self._selection_changed()
+
+    def clear_selection(self) -> None:
+        self.selected_ids.clear()
+        self._selection_changed()
+
+    def _selection_changed(self) -> None:
+        self.label_grid.viewport().update()
+        # Don't wait for the map's poll, so the whole batch goes out as one load job right away.
+        self.window_view.map_view.get_new_ids()
+
+    def show_category_menu(self, group_idx: int, pos: QPoint) -> None:
+        menu = QMenu(self)
+        select = menu.addAction("Select Category")
+        deselect = menu.addAction("Deselect Category")
+        invert = menu.addAction("Invert Category")
+        chosen = menu.exec_(pos)
+        if chosen == select:
+            self.select_category(group_idx)
+        elif chosen == deselect:
+            self.select_category(group_idx, False)
+        elif chosen == invert:
+            self.invert_selection(group_idx)
+
+    def on_search(self, text: str) -> None:
+        self.label_grid.set_search_results(LabelSearch.search(text))
+
+    def toggle_search_match(self) -> None:
+        if self.label_grid.current_match is not None:
+            self.toggle_selection(self.label_grid.current_match)
 
     def scroll_to_group(self, group_idx: int) -> None:
-        section: QWidget = self.section_widgets[group_idx]
-        self.content_scroll_area.verticalScrollBar().setValue(section.y())
+        self.label_grid.scroll_to_category(group_idx)
 
     @classmethod
-    def add_comment_card(cls, image_path: str, comment: str, username: str, date: str, auid: str, docid: str, oid: str, like_count: int = 0):
+    def add_comment_cards(cls, cards: List[CommentCard]):
         if cls.instance is None:
             raise RuntimeError("ButtonPanel instance is not initialized.")
-        card = CommentCard(image_path, comment, username, date, auid, docid, oid, like_count)
-        cls.instance.web_layout_inside.addWidget(card)
+        cls.instance.comment_list.add_cards(cards)
+
+    @classmethod
+    def add_comment_card(cls, image_path: str, comment: str, username: str, date: str, auid: str, docid: str, oid: str, like_count: int = 0):
+        cls.add_comment_cards([CommentCard(image_path, comment, username, date, auid, docid, oid, like_count)])
 
     @classmethod
     def clear_comment_cards(cls):
         if cls.instance is None:
             raise RuntimeError("ButtonPanel instance is not initialized.")
-        cls.instance.web_scroll.verticalScrollBar().setValue(0)
-        layout = cls.instance.web_layout_inside
-        while layout.count():
-            item = layout.takeAt(0)
-            widget: Optional["ButtonPanel"] = item.widget()
-            if widget is not None:
-                loader_thread: None | QThread = getattr(widget, 'loader_thread', None)
-                if loader_thread and hasattr(loader_thread, 'isRunning'):
-                    try:
-                        if loader_thread.isRunning():
-                            loader_thread.quit()
-                            loader_thread.wait()
-                    except RuntimeError:
-                        pass
-
-                widget.setParent(None)
-                widget.deleteLater()
\ No newline at end of file
+        cls.instance.comment_list.clear_cards()
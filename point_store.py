@@ -0,0 +1,70 @@
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+
+from helpers import MYSTICAL_MAGICAL_X, MYSTICAL_MAGICAL_Y
+
+
+class PointStore:
+    """
+    Column store of every official point, sorted by label so a label (or a set of labels) is a couple of slices.
+    Coordinates are kept in scene space, rounded the same way MapViewer places markers, so anything computed
+    here lines up with what is drawn without touching a single QGraphicsItem.
+    """
+    points: List[dict] = []
+    point_ids: np.ndarray = np.empty(0, dtype=np.int64)
+    label_ids: np.ndarray = np.empty(0, dtype=np.int64)
+    z_levels: np.ndarray = np.empty(0, dtype=np.int64)
+    coords: np.ndarray = np.empty((0, 2), dtype=np.float64)
+
+    _label_ranges: Dict[int, Tuple[int, int]] = {}
+    _id_order: np.ndarray = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def build(cls, point_list: List[dict]):
+        label_ids = np.fromiter((p['label_id'] for p in point_list), dtype=np.int64, count=len(point_list))
+        order = np.argsort(label_ids, kind="stable")
+
+        cls.points = [point_list[i] for i in order]
+        cls.label_ids = label_ids[order]
+        cls.point_ids = np.fromiter((p['id'] for p in cls.points), dtype=np.int64, count=len(cls.points))
+        cls.z_levels = np.fromiter((p.get('z_level', 0) for p in cls.points), dtype=np.int64, count=len(cls.points))
+
+        coords = np.empty((len(cls.points), 2), dtype=np.float64)
+        coords[:, 0] = [p['x_pos'] for p in cls.points]
+        coords[:, 1] = [p['y_pos'] for p in cls.points]
+        coords += (MYSTICAL_MAGICAL_X, MYSTICAL_MAGICAL_Y)
+        cls.coords = np.round(coords)
+
+        unique, starts, counts = np.unique(cls.label_ids, return_index=True, return_counts=True)
+        cls._label_ranges = {int(label): (int(start), int(start + count))
+                             for label, start, count in zip(unique, starts, counts)}
+        cls._id_order = np.argsort(cls.point_ids, kind="stable")
+
+    @classmethod
+    def label_range(cls, label_id: int) -> Tuple[int, int]:
+        return cls._label_ranges.get(int(label_id), (0, 0))
+
+    @classmethod
+    def rows_for_labels(cls, label_ids: Iterable[int]) -> np.ndarray:
+        ranges = [cls.label_range(label_id) for label_id in label_ids]
+        ranges = [np.arange(start, end, dtype=np.int64) for start, end in ranges if end > start]
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(ranges)
+
+    @classmethod
+    def rows_for_point_ids(cls, point_ids: Iterable[int]) -> np.ndarray:
+        """Rows for the given point ids, -1 where the id is unknown."""
+        wanted = np.asarray(list(point_ids), dtype=np.int64)
+        if not len(cls._id_order) or not len(wanted):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        sorted_ids = cls.point_ids[cls._id_order]
+        pos = np.clip(np.searchsorted(sorted_ids, wanted), 0, len(sorted_ids) - 1)
+        rows = cls._id_order[pos]
+        rows[sorted_ids[pos] != wanted] = -1
+        return rows
+
+    @classmethod
+    def points_for_label(cls, label_id: int) -> List[dict]:
+        start, end = cls.label_range(label_id)
+        return cls.points[start:end]
@@ -0,0 +1,158 @@
+import re
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_NON_WORD.split(text.lower())).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {normalize(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.keys: Set[Hashable] = set()  # Every key with a name that has this prefix, so lookups don't walk subtrees
+
+
+class SearchIndex:
+    """
+    Name lookup built once up front. Every word start of a name goes into a prefix trie ("flo" finds "Sweet Flower"),
+    and trigrams of the whole name back it up for typos ("sweat flowr"). A key can have any number of names.
+    """
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._trigrams: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._names: Dict[Hashable, List[str]] = defaultdict(list)
+        self._trigram_counts: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._names
+
+    def add(self, key: Hashable, name: str):
+        normalized = normalize(name)
+        if not normalized or normalized in self._names.get(key, ()):
+            return
+        self._names[key].append(normalized)
+
+        words = normalized.split(" ")
+        for i in range(len(words)):
+            node = self._root
+            for char in " ".join(words[i:]):
+                node = node.children.setdefault(char, _TrieNode())
+                node.keys.add(key)
+
+        grams = trigrams(normalized)
+        for gram in grams:
+            self._trigrams[gram].add(key)
+        self._trigram_counts[key] = max(self._trigram_counts.get(key, 0), len(grams))
+
+    def remove(self, key: Hashable):
+        for normalized in self._names.pop(key, []):
+            words = normalized.split(" ")
+            for i in range(len(words)):
+                node = self._root
+                for char in " ".join(words[i:]):
+                    node = node.children.get(char)
+                    if node is None:
+                        break
+                    node.keys.discard(key)
+            for gram in trigrams(normalized):
+                self._trigrams[gram].discard(key)
+        self._trigram_counts.pop(key, None)
+
+    def names(self, key: Hashable) -> List[str]:
+        return list(self._names.get(key, []))
+
+    def prefix(self, query: str) -> Set[Hashable]:
+        node = self._root
+        for char in normalize(query):
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.keys
+
+    def fuzzy(self, query: str, cutoff: float = 0.3, exclude: Iterable[Hashable] = ()) -> List[Tuple[Hashable, float]]:
+        """Keys ranked by the Dice coefficient of their trigrams and the query's, best first."""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        shared: Dict[Hashable, int] = defaultdict(int)
+        for gram in grams:
+            for key in self._trigrams.get(gram, ()):
+                shared[key] += 1
+        excluded = set(exclude)
+        scored = []
+        for key, count in shared.items():
+            if key in excluded:
+                continue
+            score = 2 * count / (len(grams) + self._trigram_counts[key])
+            if score >= cutoff:
+                scored.append((key, score))
+        scored.sort(key=lambda item: -item[1])
+        return scored
+
+    def search(self, query: str, limit: int = 20, cutoff: float = 0.3) -> List[Tuple[Hashable, float]]:
+        """
+        Prefix matches first, names that start with the query before names with a later word that does,
+        then fuzzy matches to fill up to limit.
+        """
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        results = []
+        for key in self.prefix(normalized):
+            starts = any(name.startswith(normalized) for name in self._names[key])
+            shortest = min(len(name) for name in self._names[key])
+            # Whole name starts with the query > a word does, shorter names first so "slime" ranks "Slime" on top.
+            results.append((key, (2.0 if starts else 1.5) - shortest / 1000))
+        results.sort(key=lambda item: -item[1])
+        if len(results) < limit:
+            results.extend(self.fuzzy(normalized, cutoff, exclude=[key for key, _ in results])[:limit - len(results)])
+        return results[:limit]
+
+    def best_match(self, query: str, cutoff: float = 0.5) -> Optional[Hashable]:
+        matches = self.fuzzy(query, cutoff)
+        return matches[0][0] if matches else None
+
+
+class LabelSearch:
+    """The catalog wide SearchIndex, official label names from get_all_ids() plus their button_data.json names."""
+    _index: Optional[SearchIndex] = None
+
+    @classmethod
+    def index(cls) -> SearchIndex:
+        if cls._index is None:
+            cls._index = cls._build()
+        return cls._index
+
+    @classmethod
+    def _build(cls) -> SearchIndex:
+        from helpers import get_all_ids
+        from loaded_data import LoadedData
+        index = SearchIndex()
+        button_names = LoadedData.unofficial_btn_data or {}
+        id_to_oid = LoadedData.id_oid_dataset or {}
+        for labels in get_all_ids().values():
+            for label_id, name in labels:
+                index.add(int(label_id), name)
+                oid = id_to_oid.get(str(label_id))
+                alias = (button_names.get(oid) or button_names.get(f"btn-{oid}")) if oid else None
+                if isinstance(alias, str):
+                    index.add(int(label_id), alias)
+        return index
+
+    @classmethod
+    def search(cls, query: str, limit: int = 20) -> List[int]:
+        return [key for key, _ in cls.index().search(query, limit)]
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PyQt5.QtCore import QTimer
+
+from settings import SettingsManager
+
+BASE_IMAGES = ("images/map/official/icons/high_res/arrow_pointer.png",
+               "images/map/official/icons/high_res/underground_arrow_pointer.png")
+
+
+class MarkerLayout:
+    """
+    Everything MapViewer needs to put the markers of some labels on the map: scene positions, the point each marker
+    stands for, and which base / overlay image it's drawn with as indexes into a small table of image paths.
+    """
+
+    def __init__(self, label_ids: np.ndarray, positions: np.ndarray, points: List[dict],
+                 images: List[str], base_refs: np.ndarray, overlay_refs: np.ndarray):
+        self.label_ids = label_ids
+        self.positions = positions
+        self.points = points
+        self.images = images
+        self.base_refs = base_refs
+        self.overlay_refs = overlay_refs
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    @classmethod
+    def from_store(cls, ids: Iterable[int]) -> "MarkerLayout":
+        from point_store import PointStore
+        rows = PointStore.rows_for_labels(ids)
+        label_ids = PointStore.label_ids[rows]
+        images = list(BASE_IMAGES)
+        overlay_index: Dict[int, int] = {}
+        for label_id in np.unique(label_ids).tolist():
+            overlay_index[label_id] = len(images)
+            images.append(f"images/resources/official/{label_id}.jpg")
+        return cls(
+            label_ids,
+            PointStore.coords[rows].astype(np.int64),
+            [PointStore.points[row] for row in rows.tolist()],
+            images,
+            (PointStore.z_levels[rows] != 0).astype(np.int64),
+            np.fromiter((overlay_index[label_id] for label_id in label_ids.tolist()), dtype=np.int64, count=len(rows)),
+        )
+
+
+class SelectionStore:
+    """
+    With save_obj_selections on, the selected labels are written to application_data/selection_state.json and
+    selected again at startup. Their markers are laid out from the PointStore, which takes milliseconds, so only the
+    ids are kept. If the dataset changed since the save (sha256 of the official dataset file), labels that are no
+    longer in it are dropped. Hashing, reading and writing all happen on _executor.
+    """
+    # Bump when the saved state changes shape, older files then count as made from another dataset.
+    STATE_VERSION = 2
+    SAVE_DELAY_MS = 1000
+    DATASET_PATH = 'data/official/full/full_dataset.json'
+
+    _path = "application_data/selection_state.json"
+    _timer: Optional[QTimer] = None
+    _dataset_hash: Optional[str] = None
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="selection_store")
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(SettingsManager.get_setting_value('save_obj_selections'))
+
+    @classmethod
+    def dataset_hash(cls) -> Optional[str]:
+        """Runs on the executor."""
+        if cls._dataset_hash is None:
+            digest = hashlib.sha256()
+            try:
+                with open(cls.DATASET_PATH, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(chunk)
+            except OSError:
+                return None
+            cls._dataset_hash = f"{cls.STATE_VERSION}:{digest.hexdigest()}"
+        return cls._dataset_hash
+
+    @classmethod
+    def schedule_restore(cls, map_view):
+        if cls.enabled() and (cls._task is None or cls._task.done()):
+            cls._task = asyncio.ensure_future(cls.restore(map_view))
+
+    @classmethod
+    async def restore(cls, map_view) -> bool:
+        """Selects and draws whatever was selected last time, True if anything was restored."""
+        loop = asyncio.get_event_loop()
+        state, dataset_hash = await loop.run_in_executor(cls._executor, cls._read_state)
+        if not state:
+            return False
+        try:
+            selected_ids = [int(_id) for _id in state.get("selected_ids", [])]
+        except (TypeError, ValueError) as e:
+            print(f"[warn] Ignoring broken selection state: {e}")
+            return False
+        if not dataset_hash or state.get("dataset_hash") != dataset_hash:
+            from point_store import PointStore
+            known = [_id for _id in selected_ids if PointStore.label_range(_id)[1] > 0]
+            if len(known) != len(selected_ids):
+                print(f"[SelectionStore] Dataset changed since the last save, "
+                      f"dropping {len(selected_ids) - len(known)} labels that are gone")
+            selected_ids = known
+        if not selected_ids:
+            return False
+
+        from menu import ButtonPanel
+        ButtonPanel.selected_ids[:] = selected_ids
+        map_view.load_ids(selected_ids)
+        if ButtonPanel.instance is not None:
+            ButtonPanel.instance.label_grid.viewport().update()
+        return True
+
+    @classmethod
+    def schedule_save(cls):
+        if not cls.enabled():
+            return
+        if cls._timer is None:
+            cls._timer = QTimer()
+            cls._timer.setSingleShot(True)
+            cls._timer.timeout.connect(cls.save)
+        cls._timer.start(cls.SAVE_DELAY_MS)
+
+    @classmethod
+    def save(cls):
+        if not cls.enabled():
+            return
+        from menu import ButtonPanel
+        cls._executor.submit(cls._write_state, list(ButtonPanel.selected_ids))
+
+    @classmethod
+    def _read_state(cls) -> Tuple[Optional[dict], Optional[str]]:
+        try:
+            with open(cls._path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None, None
+        return (state if isinstance(state, dict) else None), cls.dataset_hash()
+
+    @classmethod
+    def _write_state(cls, selected_ids: List[int]):
+        state = {"selected_ids": selected_ids, "dataset_hash": cls.dataset_hash()}
+        try:
+            os.makedirs(os.path.dirname(cls._path), exist_ok=True)
+            with open(cls._path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(cls._path + ".tmp", cls._path)
+        except OSError as e:
+            print(f"[warn] Failed to save selections: {e}")
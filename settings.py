@@ -1,9 +1,10 @@
 import json
 import os
 import re
-from typing import Any, Dict, List, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QTimer, QCoreApplication, pyqtSignal
 from PyQt5.QtWidgets import (
     QWidget, QCheckBox, QSpinBox, QDoubleSpinBox, QSlider, QPushButton,
     QHBoxLayout, QLabel, QColorDialog, QSizePolicy, QVBoxLayout, QFrame
@@ -11,9 +12,22 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QColor, QFont, QCursor
 
 
+class SettingsSignals(QObject):
+    changed = pyqtSignal(str, object)  # Setting key, new value
+
+
 class SettingsManager:
+    """
+    settings.json as a dict, plus the UI to edit it. Changes are announced right away through signals.changed,
+    the file itself is only written once they stop for SAVE_DELAY_MS, atomically and off the GUI thread.
+    """
+    SAVE_DELAY_MS = 500
+
     settings_data: Dict[str, Dict[str, Any]] = {}
+    signals: Optional[SettingsSignals] = None
     _json_path: str
+    _save_timer: Optional[QTimer] = None
+    _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="settings")
 
     @classmethod
     def init(cls, path: str):
@@ -22,26 +36,73 @@ class SettingsManager:
             raise FileNotFoundError(f"Settings file not found: {path}")
         with open(path, "r") as f:
             cls.settings_data = json.load(f)
+        cls.signals = SettingsSignals()
+        cls._save_timer = QTimer()
+        cls._save_timer.setSingleShot(True)
+        cls._save_timer.timeout.connect(cls.save_to_file)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(cls.flush)
 
     @classmethod
     def update_setting(cls, setting_key: str, new_value: Any):
-        if setting_key in cls.settings_data:
-            cls.settings_data[setting_key]["value"] = new_value
-            cls.save_to_file()
-        else:
+        meta = cls.settings_data.get(setting_key)
+        if meta is None:
             print(f"[SettingsManager] Key '{setting_key}' not found")
+            return
+        if meta.get("data_type") == "float":
+            new_value = round(float(new_value), meta.get("decimals", 3))
+        if meta.get("value") == new_value:
+            return
+        meta["value"] = new_value
+        cls.schedule_save()
+        if cls.signals is not None:
+            cls.signals.changed.emit(setting_key, new_value)
+
+    @classmethod
+    def subscribe(cls, setting_key: str, callback: Callable[[Any], None]):
+        """Calls callback(value) whenever setting_key changes."""
+        cls.signals.changed.connect(lambda key, value: callback(value) if key == setting_key else None)
 
     @classmethod
     def reset_settings(cls):
         for key, meta in cls.settings_data.items():
-            meta["value"] = meta.get("default")
-        cls.save_to_file()
+            if meta.get("value") != meta.get("default"):
+                cls.update_setting(key, meta.get("default"))
 
     @classmethod
-    def save_to_file(cls):
-        print(f"[SettingsManager] Saving to {cls._json_path}")
-        with open(cls._json_path, "w") as f:
-            json.dump(cls.settings_data, f, indent=4)
+    def schedule_save(cls):
+        if cls._save_timer is None:
+            cls.save_to_file()
+        else:
+            cls._save_timer.start(cls.SAVE_DELAY_MS)
+
+    @classmethod
+    def save_to_file(cls) -> Future:
+        """Writes the current settings on the writer thread, the returned future is done once they're on disk."""
+        # Serialized here so the writer never sees the dict mid-change.
+        text = json.dumps(cls.settings_data, indent=4)
+        return cls._writer.submit(cls._write, cls._json_path, text)
+
+    @classmethod
+    def flush(cls):
+        """Writes anything still waiting on the debounce and blocks until it's on disk, for shutdown."""
+        if cls._save_timer is not None and cls._save_timer.isActive():
+            cls._save_timer.stop()
+            cls.save_to_file()
+        cls._writer.submit(lambda: None).result()
+
+    @staticmethod
+    def _write(path: str, text: str):
+        print(f"[SettingsManager] Saving to {path}")
+        try:
+            with open(path + ".tmp", "w") as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"[warn] Failed to save settings: {e}")
 
     @classmethod
     def generate_ui(cls) -> List[QWidget]:
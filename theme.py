@@ -0,0 +1,136 @@
+import re
+from typing import Dict, Optional
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QWidget
+
+from settings import SettingsManager
+
+_RGBA = re.compile(r'rgba?\((\d+),\s*(\d+),\s*(\d+)(?:,\s*(\d+))?\)')
+
+
+def parse_color(value: str, fallback: QColor) -> QColor:
+    """QColor from the "rgba(r, g, b, a)" strings the color settings are stored as."""
+    match = _RGBA.search(value or "")
+    if match:
+        r, g, b, a = (int(part) if part is not None else 255 for part in match.groups())
+        return QColor(r, g, b, a)
+    color = QColor(value or "")
+    return color if color.isValid() else QColor(fallback)
+
+
+def css(color: QColor) -> str:
+    return f"rgba({color.red()}, {color.green()}, {color.blue()}, {color.alpha()})"
+
+
+class Theme:
+    """
+    The panel's look, compiled from the text_color / background_color settings into one stylesheet set on the
+    ButtonPanel. Changing a color recompiles it and sets it once (both settings changing together still only cost
+    one style pass). Widgets that paint themselves read the same colors through Theme.color(), state like the active
+    nav button goes through dynamic properties with set_property() instead of a stylesheet of its own.
+    """
+    SETTINGS = ('text_color', 'background_color')
+
+    TEMPLATE = """
+        QWidget {{
+            color: {text};
+        }}
+        QLabel, QPushButton, QToolButton {{
+            color: {text};
+        }}
+        QScrollArea {{
+            background-color: transparent;
+        }}
+        #LocationMenuButton {{
+            background-color: {background};
+            border: 1px solid black;
+            margin: 0px;
+            padding: 8px 12px;
+            color: {text};
+            font-weight: bold;
+        }}
+        #LocationMenuButton:hover {{
+            background-color: {background};
+            border: 1px solid {highlight};
+        }}
+        QScrollBar:vertical, QScrollBar:horizontal {{
+            width: 0px;
+            height: 0px;
+            background: transparent;
+        }}
+        #NavButton {{
+            background-color: {background};
+            border: 1px solid black;
+        }}
+        #NavButton:hover, #NavButton[selected="true"] {{
+            background-color: {dark};
+            border: 1px solid {highlight};
+        }}
+        #LabelSearch {{
+            background-color: {dark};
+            border: 1px solid black;
+            padding: 6px;
+        }}
+        #WebView, #WebContent, #ContentContainer, #SettingsView {{
+            background-color: {background};
+        }}
+    """
+
+    _target: Optional[QWidget] = None
+    _colors: Dict[str, QColor] = {}
+    _timer: Optional[QTimer] = None
+
+    @classmethod
+    def init(cls, target: QWidget):
+        cls._target = target
+        cls._timer = QTimer()
+        cls._timer.setSingleShot(True)
+        cls._timer.timeout.connect(cls.apply)
+        SettingsManager.signals.changed.connect(cls._setting_changed)
+        cls.apply()
+
+    @classmethod
+    def _setting_changed(cls, key: str, _value):
+        if key in cls.SETTINGS and cls._timer is not None:
+            cls._timer.start(0)
+
+    @classmethod
+    def compile(cls) -> str:
+        text = parse_color(SettingsManager.get_setting_value('text_color'), QColor(200, 200, 200, 255))
+        background = parse_color(SettingsManager.get_setting_value('background_color'), QColor(60, 60, 60, 255))
+        dark = background.darker(150)
+        header = QColor(dark)
+        header.setAlpha(200)
+        cls._colors = {
+            "text": text,
+            "background": background,
+            "dark": dark,
+            "header": header,
+            "highlight": QColor(255, 255, 255, 255),
+        }
+        return cls.TEMPLATE.format(**{name: css(color) for name, color in cls._colors.items()})
+
+    @classmethod
+    def apply(cls):
+        if cls._target is None:
+            return
+        cls._target.setStyleSheet(cls.compile())
+
+    @classmethod
+    def color(cls, name: str) -> QColor:
+        if not cls._colors:
+            cls.compile()
+        return cls._colors[name]
+
+    @staticmethod
+    def set_property(widget: QWidget, name: str, value) -> None:
+        """Sets a dynamic property the stylesheet matches on and re-polishes just that widget if it changed."""
+        if widget.property(name) == value:
+            return
+        widget.setProperty(name, value)
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
+        widget.update()
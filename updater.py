@@ -1,29 +1,280 @@
-from async_requests import AsyncRequests 
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urljoin
+
+from async_requests import AsyncRequests, RequestError, HTTPStatusError
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
 class Updater:
+    """
+    Data updates without reinstalling. A release carries a MANIFEST_NAME asset listing every data file and tile it
+    ships with its sha256 and size. Only files whose hash differs from the local copy are downloaded, each one is
+    verified and written to STAGING_DIR in the background, and the staged set is moved into place by apply_staged()
+    at the next start, before anything reads the data.
+
+    Manifest format ("version" is informational, the release name is the version that gets installed):
+        {"version": "v0.0.2", "base_url": "optional",
+         "files": {"data/official/set_1.json": {"sha256": "...", "size": 1234}, ...}}
+    With base_url each file is fetched from base_url + its path. Without it every file has to be an asset of the
+    release itself, named asset_name(path) since release assets can't have directories.
+    """
     update_url = "https://api.github.com/repos/Mipppy/a_test/releases/latest"
     version_path = "application_data/version"
     VERSION = "v0.0.1-alpha"
 
+    MANIFEST_NAME = "manifest.json"
+    STAGING_DIR = "application_data/update_staging"
+    INDEX_PATH = "application_data/update_index.json"
+    # Only data ships this way, code is never replaced under a running app.
+    UPDATABLE_DIRS = ("data/", "images/")
+    MAX_CONCURRENT = 4
+    TIMEOUT = 60.0
+
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="updater")
+    _task: Optional[asyncio.Task] = None
+
     @classmethod
-    async def check_for_updates(cls):
+    def installed_version(cls) -> str:
         try:
-            response_text = await AsyncRequests.get(cls.update_url)
-            res_json = None
-            import json
-            try:
-                res_json = json.loads(response_text)
-            except Exception as e:
-                print(f"Failed to parse update JSON: {e}")
-                return
+            with open(cls.version_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or cls.VERSION
+        except OSError:
+            return cls.VERSION
 
-            if res_json and 'name' in res_json and res_json['name'] != cls.VERSION:
-                await cls.handle_update(res_json)
-            else:
-                print("No update found or version matches.")
-        except Exception as e:
+    @classmethod
+    def schedule_check(cls):
+        """Starts check_for_updates in the background, for once the window is up."""
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.ensure_future(cls.check_for_updates())
+
+    @classmethod
+    async def check_for_updates(cls):
+        try:
+            res_json = await AsyncRequests.get_json(cls.update_url, timeout=10)
+        except HTTPStatusError as e:
+            # 403 here is almost always GitHub's rate limit, nothing to do but try again next launch.
+            print(f"Update check rejected by GitHub (HTTP {e.status}): {e}")
+            return
+        except RequestError as e:
             print(f"Update check failed: {e}")
+            return
+        except ValueError as e:
+            print(f"Failed to parse update JSON: {e}")
+            return
+
+        if res_json and 'name' in res_json and res_json['name'] != cls.installed_version():
+            await cls.handle_update(res_json)
+        else:
+            print("No update found or version matches.")
 
     @classmethod
     async def handle_update(cls, json: dict):
-        print("Updating...")
+        manifest_url = next((asset.get("browser_download_url") for asset in json.get("assets", [])
+                             if asset.get("name") == cls.MANIFEST_NAME), None)
+        if manifest_url is None:
+            print(f"[Updater] Release {json.get('name')} has no {cls.MANIFEST_NAME}, skipping")
+            return
+        try:
+            manifest = await AsyncRequests.get_json(manifest_url, timeout=cls.TIMEOUT)
+            files = cls._validate_manifest(manifest)
+        except (RequestError, ValueError) as e:
+            print(f"[Updater] Failed to get the update manifest: {e}")
+            return
+        # The release name is what check_for_updates compares against, so it's also what gets installed.
+        version = str(json.get("name"))
+        if cls._staged_version() == version:
+            print(f"[Updater] {version} is already staged, it will be applied on the next start")
+            return
+
+        loop = asyncio.get_event_loop()
+        changed = await loop.run_in_executor(cls._executor, cls._changed_files, files)
+        if not changed:
+            await loop.run_in_executor(cls._executor, cls._write_version, version)
+            print(f"[Updater] {version} changes none of the local files, nothing to stage")
+            return
+        print(f"[Updater] Updating to {version}, {len(changed)} of {len(files)} files changed")
+        try:
+            urls = cls._file_urls(manifest.get("base_url"), json.get("assets", []), changed)
+        except ValueError as e:
+            print(f"[Updater] {e}")
+            return
+        await loop.run_in_executor(cls._executor, cls._reset_staging)
+
+        semaphore = asyncio.Semaphore(cls.MAX_CONCURRENT)
+        results = await asyncio.gather(*(cls._download(semaphore, urls[path], path, files[path]) for path in changed))
+        if not all(results):
+            print("[Updater] Some files failed to download or verify, trying again next launch")
+            return
+        await loop.run_in_executor(cls._executor, cls._write_json, os.path.join(cls.STAGING_DIR, "staged.json"),
+                                   {"version": version, "files": {path: files[path] for path in changed}})
+        print(f"[Updater] {version} staged, it will be applied on the next start")
+
+    @staticmethod
+    def asset_name(path: str) -> str:
+        return path.replace("/", "__")
+
+    @classmethod
+    def _file_urls(cls, base_url: Optional[str], assets: List[dict], paths: List[str]) -> Dict[str, str]:
+        if base_url:
+            return {path: urljoin(base_url, path) for path in paths}
+        by_name = {asset.get("name"): asset.get("browser_download_url") for asset in assets}
+        missing = [path for path in paths if not by_name.get(cls.asset_name(path))]
+        if missing:
+            raise ValueError(f"Manifest has no base_url and {len(missing)} files aren't release assets, "
+                             f"e.g. {cls.asset_name(missing[0])}")
+        return {path: by_name[cls.asset_name(path)] for path in paths}
+
+    @classmethod
+    def _validate_manifest(cls, manifest: dict) -> Dict[str, dict]:
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+            raise ValueError("Manifest has no files")
+        files = {}
+        for path, meta in manifest["files"].items():
+            normalized = os.path.normpath(path).replace(os.sep, "/")
+            if normalized != path or not path.startswith(cls.UPDATABLE_DIRS) or ".." in path.split("/"):
+                raise ValueError(f"Manifest lists a path outside the updatable directories: {path}")
+            if not isinstance(meta, dict) or not isinstance(meta.get("sha256"), str):
+                raise ValueError(f"Manifest entry for {path} has no sha256")
+            files[path] = meta
+        return files
+
+    @classmethod
+    def _changed_files(cls, files: Dict[str, dict]) -> List[str]:
+        """Paths whose local copy is missing or hashes differently. Runs on the executor."""
+        index = cls._read_json(cls.INDEX_PATH) or {}
+        changed = []
+        for path, meta in files.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                changed.append(path)
+                continue
+            if "size" in meta and stat.st_size != meta["size"]:
+                changed.append(path)
+                continue
+            # Hashing every tile on every check is slow, so hashes are remembered per (size, mtime).
+            known = index.get(path)
+            if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+                digest = known[2]
+            else:
+                digest = file_sha256(path)
+                index[path] = [stat.st_size, stat.st_mtime_ns, digest]
+            if digest != meta["sha256"]:
+                changed.append(path)
+        cls._write_json(cls.INDEX_PATH, index)
+        return changed
+
+    @classmethod
+    async def _download(cls, semaphore: asyncio.Semaphore, url: str, path: str, meta: dict) -> bool:
+        async with semaphore:
+            try:
+                body = await AsyncRequests.get(url, raw=True, timeout=cls.TIMEOUT)
+            except RequestError as e:
+                print(f"[Updater] Failed to download {path}: {e}")
+                return False
+        ok = await asyncio.get_event_loop().run_in_executor(cls._executor, cls._verify_and_stage, path, body, meta)
+        if not ok:
+            print(f"[Updater] {path} didn't match the manifest hash")
+        return ok
+
+    @classmethod
+    def _verify_and_stage(cls, path: str, body: bytes, meta: dict) -> bool:
+        if hashlib.sha256(body).hexdigest() != meta["sha256"]:
+            return False
+        target = os.path.join(cls.STAGING_DIR, "files", path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(target + ".tmp", target)
+        return True
+
+    @classmethod
+    def _reset_staging(cls):
+        shutil.rmtree(cls.STAGING_DIR, ignore_errors=True)
+        os.makedirs(cls.STAGING_DIR, exist_ok=True)
+
+    @classmethod
+    def _staged_version(cls) -> Optional[str]:
+        staged = cls._read_json(os.path.join(cls.STAGING_DIR, "staged.json"))
+        return staged.get("version") if staged else None
+
+    @classmethod
+    def apply_staged(cls) -> Optional[str]:
+        """
+        Moves a completely staged update into place, returns its version if there was one.
+        Staged files are moved one by one and the marker is removed last, so an apply cut short picks up where it
+        stopped on the next start.
+        """
+        marker = os.path.join(cls.STAGING_DIR, "staged.json")
+        staged = cls._read_json(marker)
+        if not staged:
+            return None
+        version = staged.get("version")
+        staged_root = os.path.join(cls.STAGING_DIR, "files")
+        try:
+            for path in staged.get("files", {}):
+                source = os.path.join(staged_root, path)
+                if not os.path.exists(source):
+                    continue  # Already moved by an earlier, interrupted apply
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                os.replace(source, path)
+            cls._write_version(version)
+        except OSError as e:
+            # e.g. a file locked by another program, the rest is still staged and gets another go next start.
+            print(f"[Updater] Failed to apply update {version}, retrying next start: {e}")
+            return None
+        shutil.rmtree(cls.STAGING_DIR, ignore_errors=True)
+        print(f"[Updater] Applied update {version}")
+        return version
+
+    @classmethod
+    def _write_version(cls, version: str):
+        with open(cls.version_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(cls.version_path + ".tmp", cls.version_path)
+
+    @classmethod
+    def write_manifest(cls, out_path: str, version: str, roots: Iterable[str] = UPDATABLE_DIRS,
+                       base_url: str = None):
+        """
+        Builds the manifest for a release from the files under roots. Without base_url the files have to be uploaded
+        as release assets named asset_name(path).
+        """
+        files: Dict[str, dict] = {}
+        for root in roots:
+            for dirpath, _, filenames in os.walk(root):
+                for name in filenames:
+                    path = os.path.join(dirpath, name).replace(os.sep, "/")
+                    files[path] = {"sha256": file_sha256(path), "size": os.path.getsize(path)}
+        manifest = {"version": version, "files": dict(sorted(files.items()))}
+        if base_url:
+            manifest["base_url"] = base_url
+        cls._write_json(out_path, manifest)
+
+    @staticmethod
+    def _read_json(path: str) -> Optional[dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
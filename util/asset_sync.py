@@ -0,0 +1,199 @@
+"""
+Downloads map tiles and label icons into the folders LoadedData reads them from, WORKERS at a time.
+
+Every finished file is recorded in a manifest (url, ETag, Last-Modified, sha256, size, mtime), so running it again
+only sends conditional GETs and skips whatever the server says is unchanged. Interrupted downloads are kept as .part files
+and resumed with a Range request, guarded by the ETag recorded when they started. The same url listed twice is fetched once.
+
+Run from the repo root:
+    python util/asset_sync.py --har all_images.har --icons data/official/full/full_dataset.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+TILE_DIR = "images/map/official/high_res"
+ICON_DIR = "images/resources/official"
+TILE_PATTERN = re.compile(r'\d{2}_\d{2}_P0\.webp')
+
+
+def tiles_from_har(har_path: str, directory: str = TILE_DIR) -> List[Tuple[str, str]]:
+    with open(har_path, 'r') as file:
+        har_data = json.load(file)
+    urls = [entry['request']['url'] for entry in har_data['log']['entries']]
+    return [(url, os.path.join(directory, url.split('/')[-1])) for url in urls if TILE_PATTERN.search(url)]
+
+
+def icons_from_dataset(dataset_path: str, directory: str = ICON_DIR) -> List[Tuple[str, str]]:
+    with open(dataset_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    data = data.get('data', data)  # A set_*.json or the full dataset
+    return [(label['icon'], os.path.join(directory, f"{label['id']}.jpg"))
+            for label in data.get('label_list', []) if label.get('icon')]
+
+
+class AssetSync:
+    CHUNK_SIZE = 1 << 16
+    TIMEOUT = 30
+
+    def __init__(self, manifest_path: str = "application_data/asset_manifest.json", workers: int = 8):
+        self.manifest_path = manifest_path
+        self.workers = workers
+        self.manifest: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Workers save the manifest concurrently, they share the .tmp file
+        self._local = threading.local()
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def _session(self) -> requests.Session:
+        # One per worker thread, so each keeps its own connections alive.
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def sync(self, assets: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+        """Downloads (url, destination) pairs, returns how many were downloaded, unchanged or failed."""
+        unique: Dict[str, str] = {}
+        for url, dest in assets:
+            unique.setdefault(url, dest)
+        counts = {"downloaded": 0, "unchanged": 0, "failed": 0}
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self.fetch, url, dest): dest for url, dest in unique.items()}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except (requests.RequestException, OSError) as e:
+                        print(f"Failed to download {futures[future]}: {e}")
+                        result = "failed"
+                    counts[result] += 1
+        finally:
+            self.save_manifest()
+        return counts
+
+    def fetch(self, url: str, dest: str) -> str:
+        with self._lock:
+            entry = self.manifest.get(dest)
+        headers = {}
+        if entry and entry.get("url") == url and self._matches(dest, entry):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        part = dest + ".part"
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        with self._lock:
+            partial_etag = (self.manifest.get(part) or {}).get("etag")
+        if offset and not partial_etag:
+            # Without the ETag it was started with there's no telling whether the partial file is still the same
+            # file, so start over rather than glue two versions together.
+            os.remove(part)
+            offset = 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = partial_etag
+
+        with self._session().get(url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+            if response.status_code == 304:
+                return "unchanged"
+            if response.status_code == 416:
+                # The partial file is already complete, or junk. Start over next run.
+                os.remove(part)
+                return "failed"
+            response.raise_for_status()
+
+            os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+            resumed = response.status_code == 206 and offset > 0
+            with self._lock:
+                self.manifest[part] = {"etag": response.headers.get("ETag")}
+            # Saved right away, a crash halfway through the download has to leave the ETag behind for the resume.
+            self.save_manifest()
+            with open(part, "ab" if resumed else "wb") as f:
+                for chunk in response.iter_content(self.CHUNK_SIZE):
+                    f.write(chunk)
+
+            info = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": self._sha256(part),
+                "size": os.path.getsize(part),
+            }
+        os.replace(part, dest)
+        info["mtime_ns"] = os.stat(dest).st_mtime_ns
+        with self._lock:
+            self.manifest.pop(part, None)
+            self.manifest[dest] = info
+        print(f"Downloaded: {dest}")
+        return "downloaded"
+
+    def _matches(self, dest: str, entry: dict) -> bool:
+        """
+        Whether the file on disk is still the one the manifest describes. Same size and mtime is taken as unchanged,
+        the file is only hashed when the mtime moved.
+        """
+        try:
+            stat = os.stat(dest)
+        except OSError:
+            return False
+        if stat.st_size != entry.get("size"):
+            return False
+        if stat.st_mtime_ns == entry.get("mtime_ns"):
+            return True
+        if self._sha256(dest) != entry.get("sha256"):
+            return False
+        with self._lock:
+            entry["mtime_ns"] = stat.st_mtime_ns  # Touched but not changed, no need to hash it again next run
+        return True
+
+    def _sha256(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        with self._save_lock:
+            with self._lock:
+                text = json.dumps(self.manifest, indent=2)
+            with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--har", help="HAR capture to take map tile urls from")
+    parser.add_argument("--icons", help="Dataset json to take label icon urls from")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--manifest", default="application_data/asset_manifest.json")
+    args = parser.parse_args(argv)
+
+    assets: List[Tuple[str, str]] = []
+    if args.har:
+        assets += tiles_from_har(args.har)
+    if args.icons:
+        assets += icons_from_dataset(args.icons)
+    if not assets:
+        parser.error("Nothing to download, pass --har and/or --icons")
+
+    counts = AssetSync(args.manifest, args.workers).sync(assets)
+    print(f"{counts['downloaded']} downloaded, {counts['unchanged']} unchanged, {counts['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
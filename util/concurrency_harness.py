@@ -0,0 +1,100 @@
+"""
+Fires many requests at once through AsyncRequests and checks that every one gets its own reply back.
+
+The local stand-in echoes the request path after a random delay, so replies finish in a different order than the
+requests went out and most of them wait in the per host queue. A share of the requests are cancelled halfway to
+make sure cancelled ones don't hand their reply to someone else. Exit status is the number of wrong replies.
+
+Run from the repo root:
+    python util/concurrency_harness.py --requests 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication
+from qasync import QEventLoop
+
+from async_requests import AsyncRequests
+from http_cache import ResponseCache
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(random.uniform(0, 0.05))
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Cancelled on the client side
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def main(count: int, cancel_share: float) -> int:
+    server, base_url = start_server()
+    paths = [f"/item/{i}?payload={'x' * random.randint(0, 4000)}" for i in range(count)]
+    tasks = [asyncio.ensure_future(AsyncRequests.get(base_url + path, timeout=30, retries=0)) for path in paths]
+    cancelled = set(random.sample(range(count), int(count * cancel_share)))
+
+    await asyncio.sleep(0.02)
+    for i in cancelled:
+        tasks[i].cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    wrong = 0
+    finished = 0
+    for i, (path, result) in enumerate(zip(paths, results)):
+        if isinstance(result, asyncio.CancelledError):
+            continue
+        if isinstance(result, Exception):
+            wrong += 1
+            print(f"FAIL  {path[:20]} raised {type(result).__name__}: {result}")
+        elif result != path:
+            wrong += 1
+            print(f"FAIL  {path[:20]} got the reply for {result[:20]}")
+        else:
+            finished += 1
+    print(f"{finished} correct, {wrong} wrong, {count - finished - wrong} cancelled, "
+          f"{AsyncRequests.in_flight_count()} still in flight, {AsyncRequests.handler().queued_count()} queued")
+    server.shutdown()
+    return wrong
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--cancel", type=float, default=0.1, help="Share of requests cancelled halfway")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+
+    ResponseCache.init(tempfile.mkdtemp())
+    AsyncRequests.init(app)
+
+    with loop:
+        sys.exit(loop.run_until_complete(main(args.requests, args.cancel)))
@@ -0,0 +1,171 @@
+"""
+Counts how many TCP connections it takes to load N comment thumbnails through ThumbnailCache.
+
+Spins up a local HTTPS stand-in for game-cdn.appsample.com (plain HTTP if openssl isn't around to make a
+self signed cert or Qt was built without TLS), points N loaders at it and reports connections opened per N images, once through the shared
+network manager and once the old way with a QNetworkAccessManager per loader for comparison.
+
+Run from the repo root:
+    python util/connection_harness.py --images 100
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, QSize, QUrl
+from PyQt5.QtGui import QGuiApplication, QImage, QColor
+from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest, QSslSocket
+from qasync import QEventLoop
+
+from async_requests import AsyncRequests
+from comment_thumbnails import ThumbnailCache
+from http_cache import ResponseCache
+
+
+def make_png() -> bytes:
+    image = QImage(64, 64, QImage.Format.Format_ARGB32)
+    image.fill(QColor("orange"))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(data)
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def get_request(self):
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+
+
+def make_handler(body: bytes):
+    class ImageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, otherwise every request is a new connection anyway
+
+        def do_GET(self):
+            with self.server.lock:
+                self.server.requests += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")  # Measure the network, not the response cache
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ImageHandler
+
+
+def start_server() -> tuple[CountingServer, str]:
+    server = CountingServer(("127.0.0.1", 0), make_handler(make_png()))
+    scheme = "http"
+    if not QSslSocket.supportsSsl():
+        # Every https request would fail before it got a connection, and the counts would mean nothing.
+        print("Qt has no TLS support here, using plain HTTP")
+    elif shutil.which("openssl"):
+        cert_dir = tempfile.mkdtemp()
+        cert, key = os.path.join(cert_dir, "cert.pem"), os.path.join(cert_dir, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}"
+
+
+def trust_everything(manager: QNetworkAccessManager):
+    manager.sslErrors.connect(lambda reply, errors: reply.ignoreSslErrors())
+
+
+async def load_shared(base_url: str, count: int) -> int:
+    """What the comment list does, every thumbnail through ThumbnailCache and the shared AsyncRequests manager."""
+    size = QSize(64, 64)
+    results = await asyncio.gather(*(ThumbnailCache.thumbnail(f"{base_url}/comment/{i}.png", size)
+                                     for i in range(count)), return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        print(f"{len(failed)} thumbnails failed, e.g. {failed[0]}")
+    return count - len(failed)
+
+
+async def load_per_loader_manager(base_url: str, count: int) -> int:
+    """What the old per image loader did, a brand new QNetworkAccessManager for every image."""
+    done = asyncio.get_event_loop().create_future()
+    remaining = [count]
+    managers = []
+
+    def one_done(reply):
+        reply.deleteLater()
+        remaining[0] -= 1
+        if remaining[0] == 0 and not done.done():
+            done.set_result(None)
+
+    for i in range(count):
+        manager = QNetworkAccessManager()
+        trust_everything(manager)
+        manager.finished.connect(one_done)
+        managers.append(manager)
+        manager.get(QNetworkRequest(QUrl(f"{base_url}/comment/{i}.png")))
+    await done
+    return count
+
+
+async def main(count: int):
+    server, base_url = start_server()
+    print(f"Stand-in server on {base_url}")
+
+    server.reset()
+    images = await load_per_loader_manager(base_url, count)
+    print(f"Manager per loader: {server.connections} connections for {images} images ({server.requests} requests)")
+
+    server.reset()
+    images = await load_shared(base_url, count)
+    print(f"Shared manager:     {server.connections} connections for {images} images ({server.requests} requests)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=100)
+    args = parser.parse_args()
+
+    app = QGuiApplication(sys.argv)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+
+    ResponseCache.init(tempfile.mkdtemp())
+    ThumbnailCache.init(tempfile.mkdtemp())
+    AsyncRequests.init(app)
+    trust_everything(AsyncRequests.handler().manager)
+
+    with loop:
+        loop.run_until_complete(main(args.images))
@@ -0,0 +1,139 @@
+"""
+Checks AsyncRequests' deadlines, retries and circuit breaker against a local server that fails on purpose.
+
+The stand-in answers /ok with 200, /fail with 503, /slow after SLOW_SECONDS and /flaky with 503 until it has
+been asked FLAKY_FAILURES times. Every scenario prints PASS or FAIL and the exit status is the number of failures.
+
+Run from the repo root:
+    python util/fault_harness.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication
+from qasync import QEventLoop
+
+from async_requests import AsyncRequests, CircuitOpenError, HTTPStatusError, RequestTimeout
+from http_cache import ResponseCache
+
+SLOW_SECONDS = 3.0
+FLAKY_FAILURES = 2
+
+
+class FaultServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.flaky_requests = 0
+
+
+class FaultHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        status = 200
+        if path == "/fail":
+            status = 503
+        elif path == "/slow":
+            time.sleep(SLOW_SECONDS)
+        elif path == "/flaky":
+            with self.server.lock:
+                self.server.flaky_requests += 1
+                if self.server.flaky_requests <= FLAKY_FAILURES:
+                    status = 503
+        body = f"{path} {status}".encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up on /slow
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> tuple[FaultServer, str]:
+    server = FaultServer(("127.0.0.1", 0), FaultHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+failures = 0
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    global failures
+    if not ok:
+        failures += 1
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail and not ok else ''}")
+
+
+async def expect(coro, exception: type) -> tuple[bool, str]:
+    try:
+        result = await coro
+    except exception:
+        return True, ""
+    except Exception as e:
+        return False, f"raised {type(e).__name__}: {e}"
+    return False, f"returned {result!r}"
+
+
+async def main() -> int:
+    server, base_url = start_server()
+    breaker = AsyncRequests.breaker_for("127.0.0.1")
+
+    ok, detail = await expect(AsyncRequests.get(f"{base_url}/slow", timeout=0.5, retries=0), RequestTimeout)
+    check("a reply slower than the deadline raises RequestTimeout", ok, detail)
+    breaker.record_success()
+
+    body = await AsyncRequests.get(f"{base_url}/flaky", timeout=5, retries=FLAKY_FAILURES)
+    check("transient 503s are retried until the request succeeds", body == "/flaky 200", body)
+
+    for _ in range(breaker.FAILURE_THRESHOLD):
+        await expect(AsyncRequests.get(f"{base_url}/fail", retries=0), HTTPStatusError)
+    check("the breaker opens after FAILURE_THRESHOLD transient failures", breaker.is_open)
+    ok, detail = await expect(AsyncRequests.get(f"{base_url}/ok", retries=0), CircuitOpenError)
+    check("an open breaker fails requests fast", ok, detail)
+
+    # Pretend the reset timeout passed, then cancel the trial request halfway.
+    breaker.opened_at = time.monotonic() - breaker.RESET_TIMEOUT - 1
+    trial = asyncio.ensure_future(AsyncRequests.get(f"{base_url}/slow", timeout=10, retries=0))
+    await asyncio.sleep(0.5)
+    trial.cancel()
+    await asyncio.gather(trial, return_exceptions=True)
+    check("a cancelled trial request releases the trial slot", not breaker.trial_running)
+
+    try:
+        body = await AsyncRequests.get(f"{base_url}/ok", timeout=5, retries=0)
+    except Exception as e:
+        body = f"raised {type(e).__name__}: {e}"
+    check("the next request after a cancelled trial goes through", body == "/ok 200", body)
+    check("a successful trial closes the breaker", breaker.opened_at is None and breaker.failures == 0)
+
+    server.shutdown()
+    return failures
+
+
+if __name__ == "__main__":
+    app = QCoreApplication(sys.argv)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+
+    ResponseCache.init(tempfile.mkdtemp())
+    AsyncRequests.init(app)
+
+    with loop:
+        sys.exit(loop.run_until_complete(main()))
@@ -0,0 +1,185 @@
+"""
+Checks AssetSync's conditional GETs and interrupted download resume against a local server that speaks ETag and Range.
+
+The stand-in serves one file at /asset with a strong ETag, answers If-None-Match with 304, Range with 206 unless
+If-Range names another version, and can be told to drop the connection halfway through the next response to play a
+crash. Every scenario prints PASS or FAIL and the exit status is the number of failures.
+
+Run from the repo root:
+    python util/resume_harness.py
+"""
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from asset_sync import AssetSync
+
+SIZE = 256 * 1024
+
+
+class ResumeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.set_content(os.urandom(SIZE))
+        self.cut_next = False
+        self.requests = []  # (status, request headers) of every GET
+
+    def set_content(self, content: bytes):
+        with self.lock:
+            self.content = content
+            self.etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+
+
+class ResumeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            content, etag = server.content, server.etag
+            cut, server.cut_next = server.cut_next, False
+
+        start = 0
+        status = 200
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if self.headers.get("If-None-Match") == etag:
+            status = 304
+        elif match and self.headers.get("If-Range", etag) == etag:
+            start = int(match.group(1))
+            status = 206 if start < len(content) else 416
+        with server.lock:
+            server.requests.append((status, dict(self.headers)))
+
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        if status in (304, 416):
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = content[start:]
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            if cut:
+                # Send half of what was promised and hang up, like a crash or a dropped connection.
+                self.wfile.write(body[:len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> tuple[ResumeServer, str]:
+    server = ResumeServer(("127.0.0.1", 0), ResumeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class CountingSync(AssetSync):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hashed = 0
+
+    def _sha256(self, path: str) -> str:
+        self.hashed += 1
+        return super()._sha256(path)
+
+
+failures = 0
+
+
+def check(name: str, ok: bool, detail: str = ""):
+    global failures
+    if not ok:
+        failures += 1
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{f' ({detail})' if detail and not ok else ''}")
+
+
+def content_of(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def interrupted_fetch(server: ResumeServer, sync: AssetSync, url: str, dest: str) -> bool:
+    """Runs a fetch that the server cuts short, True if it failed the way a crash would leave it."""
+    server.cut_next = True
+    try:
+        sync.fetch(url, dest)
+    except (requests.RequestException, OSError):
+        return os.path.exists(dest + ".part")
+    return False
+
+
+def main() -> int:
+    server, base_url = start_server()
+    url = f"{base_url}/asset"
+    work_dir = tempfile.mkdtemp()
+    manifest = os.path.join(work_dir, "manifest.json")
+    dest = os.path.join(work_dir, "files", "asset.bin")
+
+    # Each new AssetSync reads the manifest from disk, like the next run after a crash.
+    result = CountingSync(manifest).sync([(url, dest)])
+    check("a new file is downloaded", result["downloaded"] == 1 and content_of(dest) == server.content, str(result))
+
+    sync = CountingSync(manifest)
+    result = sync.sync([(url, dest)])
+    status, headers = server.requests[-1]
+    check("an unchanged file is revalidated with If-None-Match", status == 304 and result["unchanged"] == 1,
+          f"{status} {result}")
+    check("an untouched file isn't hashed", sync.hashed == 0, f"hashed {sync.hashed} times")
+
+    os.utime(dest)
+    sync = CountingSync(manifest)
+    sync.sync([(url, dest)])
+    check("a touched but unchanged file is hashed once and still revalidated",
+          sync.hashed == 1 and server.requests[-1][0] == 304, f"hashed {sync.hashed} times")
+
+    os.remove(dest)
+    server.set_content(os.urandom(SIZE))
+    check("an interrupted download leaves a .part behind", interrupted_fetch(server, CountingSync(manifest), url, dest))
+    result = CountingSync(manifest).sync([(url, dest)])
+    status, headers = server.requests[-1]
+    check("the next run resumes with Range and the ETag it started with as If-Range",
+          status == 206 and headers.get("If-Range") == server.etag, f"{status} {headers.get('If-Range')}")
+    check("the resumed file is complete", content_of(dest) == server.content and result["downloaded"] == 1)
+
+    os.remove(dest)
+    interrupted_fetch(server, CountingSync(manifest), url, dest)
+    server.set_content(os.urandom(SIZE))
+    CountingSync(manifest).sync([(url, dest)])
+    status, headers = server.requests[-1]
+    check("a file that changed since the partial download is fetched whole", status == 200, str(status))
+    check("and isn't glued onto the old partial file", content_of(dest) == server.content)
+
+    os.remove(dest)
+    interrupted_fetch(server, CountingSync(manifest), url, dest)
+    sync = CountingSync(manifest)
+    sync.manifest.pop(dest + ".part", None)
+    sync.save_manifest()
+    CountingSync(manifest).sync([(url, dest)])
+    status, headers = server.requests[-1]
+    check("a .part without a recorded ETag is started over", status == 200 and "Range" not in headers, str(status))
+    check("and the download is complete", content_of(dest) == server.content)
+
+    server.shutdown()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt5.QtCore import QTimer
+
+from async_requests import AsyncRequests, RequestError
+
+VoteKey = Tuple[str, str, str]  # oid, docId, auid
+VoteCallback = Callable[[bool, str], None]
+
+
+class PendingVote:
+    def __init__(self, oid: str, docid: str, auid: str, vote: Optional[str], base: Optional[str]):
+        self.oid = oid
+        self.docid = docid
+        self.auid = auid
+        self.vote = vote  # What the user ended up on, "up", "down" or None
+        self.base = base  # What the server was last told
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self.in_flight = False
+        self.generation = 0  # Bumped on every toggle, so a send that finishes knows if it's already outdated
+
+    @property
+    def key(self) -> VoteKey:
+        return self.oid, self.docid, self.auid
+
+    def to_json(self) -> dict:
+        return {"oid": self.oid, "docid": self.docid, "auid": self.auid, "vote": self.vote, "base": self.base}
+
+
+class VoteOutbox:
+    """
+    Votes on comments go through here instead of straight to the server.
+    Toggles on the same comment within DEBOUNCE_MS collapse into the one final action (or nothing if the user ended up
+    where they started), pending votes survive a restart in application_data/pending_votes.json, and sends run
+    MAX_CONCURRENT at a time with backoff for the ones that fail.
+    """
+    VOTE_URL = "https://cache-v2-origin.lemonapi.com/comments/v2?app=gim&collection={oid}&docId={docid}"
+    UID = '5rNZCHeYmpJFWLE3'
+    DEBOUNCE_MS = 1500
+    MAX_CONCURRENT = 3
+    TIMEOUT = 10.0
+    RETRY_DELAY = 30.0
+    MAX_RETRY_DELAY = 600.0
+
+    _path = "application_data/pending_votes.json"
+    _pending: Dict[VoteKey, PendingVote] = {}
+    _callbacks: Dict[VoteKey, List[VoteCallback]] = {}
+    _timer: Optional[QTimer] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def init(cls, path: str = None):
+        if path:
+            cls._path = path
+        cls._timer = QTimer()
+        cls._timer.setSingleShot(True)
+        cls._timer.timeout.connect(lambda: asyncio.ensure_future(cls.flush()))
+        cls._load()
+        if cls._pending:
+            cls._timer.start(0)
+
+    @classmethod
+    def _load(cls):
+        try:
+            with open(cls._path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for item in saved:
+            try:
+                vote = PendingVote(item["oid"], item["docid"], item["auid"], item["vote"], item["base"])
+            except (KeyError, TypeError):
+                continue
+            cls._pending[vote.key] = vote
+
+    @classmethod
+    def _save(cls):
+        try:
+            os.makedirs(os.path.dirname(cls._path) or ".", exist_ok=True)
+            with open(cls._path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump([vote.to_json() for vote in cls._pending.values()], f)
+            os.replace(cls._path + ".tmp", cls._path)
+        except OSError as e:
+            print(f"[warn] Failed to save pending votes: {e}")
+
+    @classmethod
+    def pending_vote(cls, oid: str, docid: str, auid: str) -> Optional[PendingVote]:
+        return cls._pending.get((oid, docid, auid))
+
+    @classmethod
+    def watch(cls, oid: str, docid: str, auid: str, callback: VoteCallback):
+        """Adds a callback(ok, message) for when the pending vote on this comment is settled."""
+        callbacks = cls._callbacks.setdefault((oid, docid, auid), [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    @classmethod
+    def enqueue(cls, oid: str, docid: str, auid: str, vote: Optional[str], previous: Optional[str],
+                callback: VoteCallback = None):
+        """
+        Records that the user moved from previous to vote on a comment. callback(ok, message) is called once the vote
+        reached the server, or couldn't.
+        """
+        key = (oid, docid, auid)
+        if callback is not None:
+            cls.watch(oid, docid, auid, callback)
+
+        pending = cls._pending.get(key)
+        if pending is None:
+            pending = PendingVote(oid, docid, auid, vote, previous)
+            cls._pending[key] = pending
+        pending.vote = vote
+        pending.generation += 1
+        pending.attempts = 0
+        pending.next_attempt = 0.0
+
+        if pending.vote == pending.base and not pending.in_flight:
+            del cls._pending[key]
+            cls._report(key, True, "Nothing to send")
+        cls._save()
+        if cls._timer is not None:
+            cls._timer.start(cls.DEBOUNCE_MS)
+
+    @classmethod
+    def _report(cls, key: VoteKey, ok: bool, message: str):
+        for callback in cls._callbacks.pop(key, []):
+            try:
+                callback(ok, message)
+            except RuntimeError:
+                pass  # Whatever showed the vote is gone
+
+    @classmethod
+    async def flush(cls):
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(cls.MAX_CONCURRENT)
+        now = time.time()
+        due = [vote for vote in cls._pending.values() if not vote.in_flight and vote.next_attempt <= now]
+        await asyncio.gather(*(cls._send(vote) for vote in due))
+        cls._schedule_retry()
+
+    @classmethod
+    def _schedule_retry(cls):
+        waiting = [vote.next_attempt for vote in cls._pending.values() if not vote.in_flight]
+        if waiting and cls._timer is not None and not cls._timer.isActive():
+            delay = max(0.0, min(waiting) - time.time())
+            cls._timer.start(int(delay * 1000))
+
+    @classmethod
+    async def _send(cls, pending: PendingVote):
+        async with cls._semaphore:
+            if cls._pending.get(pending.key) is not pending:
+                return
+            pending.in_flight = True
+            generation, vote = pending.generation, pending.vote
+            url = cls.VOTE_URL.format(oid=pending.oid, docid=pending.docid)
+            payload = {
+                "action": f"{vote}Vote",
+                "uid": cls.UID,
+                "auid": pending.auid
+            }
+            try:
+                await AsyncRequests.request("PUT", url, data=json.dumps(payload).encode("utf-8"),
+                                            headers={"Content-Type": "application/json"}, timeout=cls.TIMEOUT)
+                error = None
+            except RequestError as e:
+                error = e
+            finally:
+                pending.in_flight = False
+
+        if error is None:
+            pending.base = vote
+        elif error.transient:
+            pending.attempts += 1
+            pending.next_attempt = time.time() + min(cls.MAX_RETRY_DELAY, cls.RETRY_DELAY * 2 ** (pending.attempts - 1))
+            print(f"[warn] Vote failed, retrying later: {error}")
+            cls._save()
+            return
+        else:
+            print(f"[warn] Vote rejected: {error}")
+            del cls._pending[pending.key]
+            cls._save()
+            cls._report(pending.key, False, str(error))
+            return
+
+        # The user toggled again while this was being sent, the newer vote goes out on the next flush.
+        if pending.generation != generation and pending.vote != pending.base:
+            cls._save()
+            return
+        del cls._pending[pending.key]
+        cls._save()
+        cls._report(pending.key, True, "Vote sent")
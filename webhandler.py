@@ -1,60 +1,144 @@
+import asyncio
 import datetime
-import json
-from async_requests import AsyncRequests
+from typing import Optional
+from urllib.parse import urlencode
+from async_requests import AsyncRequests, RequestError
 from menu import ButtonPanel
+from comment_card import CommentCard
 from loaded_data import LoadedData
 
+
+class CommentFeed:
+    """Paging state of the comments of one marker."""
+
+    def __init__(self, oid: str, uid: str):
+        self.oid = oid
+        self.uid = uid
+        self.next_page = 1
+        self.exhausted = False
+        self.loading = False
+
+
 class UnofficialDataLoader:
     image_loading_url = "https://game-cdn.appsample.com/"
-    
+    comments_url = "https://cache-v2.lemonapi.com/comments/v2"
+    headers = {
+        "Accept": "application/json, text/plain, */*",
+        "Origin": "https://genshin-impact-map.appsample.com",
+        "Referer": "https://genshin-impact-map.appsample.com/",
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:140.0) Gecko/20100101 Firefox/140.0"
+    }
+    ttl = 7000
+    # Small first page so something shows up fast, the rest is fetched as the panel is scrolled.
+    PAGE_SIZE = 10
+    # How close to the bottom of the web panel (in pixels) the next page starts loading.
+    PREFETCH_MARGIN = 400
+
+    _feed: Optional[CommentFeed] = None
+    _task: Optional[asyncio.Task] = None
+    _scroll_connected = False
+
     @classmethod
-    async def load_unofficial_data(cls, _id: int, label_id: int):
-        oid = LoadedData.id_oid_dataset.get(str(label_id))
-        uid = LoadedData.official_id_to_unofficial_id.get(str(_id))
-        if not oid or not uid:
-            print(f"Invalid OID or UID for label_id={label_id}, _id={_id}")
-            return
-        url = "https://cache-v2.lemonapi.com/comments/v2"
+    def page_url(cls, oid: str, uid: str, page: int) -> str:
         params = {
             "app": "gim",
-            "ttl": 7000,
+            "ttl": cls.ttl,
             "collection": oid,
             "docId": uid,
             "sort": "",
-            "page": 1,
-            "pageSize": 100
-        }
-        headers = {
-            "Accept": "application/json, text/plain, */*",
-            "Origin": "https://genshin-impact-map.appsample.com",
-            "Referer": "https://genshin-impact-map.appsample.com/",
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:140.0) Gecko/20100101 Firefox/140.0"
+            "page": page,
+            "pageSize": cls.PAGE_SIZE
         }
+        return f"{cls.comments_url}?{urlencode(params)}"
+
+    @classmethod
+    def open_marker(cls, _id: int, label_id: int):
+        """Shows the comments of a marker, dropping whatever the previous marker was still loading."""
+        cls.cancel()
+        ButtonPanel.clear_comment_cards()
+
+        oid = LoadedData.id_oid_dataset.get(str(label_id))
+        uid = LoadedData.official_id_to_unofficial_id.get(str(_id))
+        if not oid or not uid:
+            print(f"Invalid OID or UID for label_id={label_id}, _id={_id}")
+            return
 
-        from urllib.parse import urlencode
-        query_str = urlencode({k: list(v) if isinstance(v, set) else v for k, v in params.items()})
-        full_url = f"{url}?{query_str}"
+        cls._connect_scroll()
+        cls._feed = CommentFeed(oid, uid)
+        cls._load_next_page()
 
+    @classmethod
+    def cancel(cls):
+        cls._feed = None
+        if cls._task is not None and not cls._task.done():
+            cls._task.cancel()
+        cls._task = None
+
+    @classmethod
+    def _connect_scroll(cls):
+        if cls._scroll_connected or ButtonPanel.instance is None:
+            return
+        scroll_bar = ButtonPanel.instance.comment_list.verticalScrollBar()
+        scroll_bar.valueChanged.connect(lambda _: cls._maybe_prefetch())
+        scroll_bar.rangeChanged.connect(lambda *_: cls._maybe_prefetch())
+        cls._scroll_connected = True
+
+    @classmethod
+    def _maybe_prefetch(cls):
+        feed = cls._feed
+        if feed is None or feed.exhausted or feed.loading or ButtonPanel.instance is None:
+            return
+        scroll_bar = ButtonPanel.instance.comment_list.verticalScrollBar()
+        # A page that doesn't fill the panel has no scroll range, so it counts as being at the bottom.
+        if scroll_bar.maximum() - scroll_bar.value() <= cls.PREFETCH_MARGIN:
+            cls._load_next_page()
+
+    @classmethod
+    def _load_next_page(cls):
+        feed = cls._feed
+        if feed is None or feed.loading or feed.exhausted:
+            return
+        feed.loading = True
+        cls._task = asyncio.create_task(cls._fetch_page(feed, feed.next_page))
+
+    @classmethod
+    async def _fetch_page(cls, feed: CommentFeed, page: int):
         try:
-            response_text = await AsyncRequests.get(full_url, headers=headers)
-            data = json.loads(response_text)
-        except Exception as e:
+            data = await AsyncRequests.get_json(cls.page_url(feed.oid, feed.uid, page), headers=cls.headers,
+                                                cache=True, cache_ttl=cls.ttl)
+        except (RequestError, ValueError) as e:
             print(f"Failed to load unofficial data: {e}")
+            feed.loading = False
             return
+        finally:
+            if cls._task is asyncio.current_task():
+                cls._task = None
+
+        # Another marker was clicked while this page was in flight.
+        if feed is not cls._feed:
+            return
+
         comments = data.get("data", {}).get("comments", [])
-        for comment in comments:
-            username = comment.get("aname", "Anonymous")
-            text = comment.get("content", "")
-            auid = comment.get("auid", "")
-            time_raw = comment.get("time", "")
-            votes = comment.get("vote", 0)
-            image = comment.get("image", "")
-
-            try:
-                dt = datetime.datetime.fromisoformat(time_raw.replace("Z", "+00:00"))
-                date = dt.strftime("%Y-%m-%d")
-            except Exception:
-                date = "Unknown"
-
-            image_path = cls.image_loading_url.rstrip('/') + image if image else None
-            ButtonPanel.add_comment_card(image_path, text, username, date, auid, uid, oid, votes)
+        feed.next_page = page + 1
+        feed.exhausted = len(comments) < cls.PAGE_SIZE
+        ButtonPanel.add_comment_cards([cls._make_card(feed, comment) for comment in comments])
+        feed.loading = False
+        cls._maybe_prefetch()
+
+    @classmethod
+    def _make_card(cls, feed: CommentFeed, comment: dict) -> CommentCard:
+        username = comment.get("aname", "Anonymous")
+        text = comment.get("content", "")
+        auid = comment.get("auid", "")
+        time_raw = comment.get("time", "")
+        votes = comment.get("vote", 0)
+        image = comment.get("image", "")
+
+        try:
+            dt = datetime.datetime.fromisoformat(time_raw.replace("Z", "+00:00"))
+            date = dt.strftime("%Y-%m-%d")
+        except Exception:
+            date = "Unknown"
+
+        image_path = cls.image_loading_url.rstrip('/') + image if image else None
+        return CommentCard(image_path, text, username, date, auid, feed.uid, feed.oid, votes)